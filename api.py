@@ -0,0 +1,316 @@
+"""Versioned JSON read API for widgets and other polling clients.
+
+The same figures the dashboards, approval queue and reports render, from the
+same utils.py functions, without the HTML:
+
+    GET /api/v1/worker/stats
+    GET /api/v1/admin/dashboard
+    GET /api/v1/admin/workers/<worker_id>/stats
+    GET /api/v1/admin/approvals?cursor=...
+    GET /api/v1/admin/reports?start_date=YYYY-MM-DD&end_date=...&worker_id=...&status_filter=...
+
+Requests are authenticated by the login session. Money is sent as a
+decimal string ("12.50") so no precision is lost to floats, dates and
+datetimes as ISO 8601 (datetimes in UTC).
+
+?fields= takes a comma-separated list of the fields to return, with dots
+for nested ones, e.g. fields=pending_count,workers.name,workers.paid_total.
+Sections that are not asked for are not computed: a report without
+workers.completions skips the line item query. Responses carry the same
+ETag as the pages (see data_version.py), so polling clients that send
+If-None-Match get 304 until the household's data changes.
+
+orjson is used for encoding when installed, the json module otherwise.
+"""
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from functools import wraps
+
+from flask import Blueprint, Response, request
+from flask_login import current_user
+
+from models import User
+from forms import ReportForm
+from auth import owns_worker
+from data_version import conditional
+from utils import get_worker_stats, get_admin_dashboard_snapshot, get_pending_approvals_page, count_pending_approvals, get_all_admin_activity, get_all_worker_activity, get_week_dates
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+API_PREFIX = '/api/v1'
+
+bp = Blueprint('api', __name__, url_prefix=API_PREFIX)
+
+
+# Encoding
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        # Stored datetimes are naive UTC
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data):
+    """Encode data as compact JSON bytes, with Decimals as strings and dates as ISO 8601"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NAIVE_UTC)
+    return json.dumps(data, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def _json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+
+def _error(status, message, **details):
+    return _json_response({'error': message, **details}, status)
+
+
+# Field selection
+
+class FieldError(ValueError):
+    """A ?fields= path that does not exist in the response"""
+
+
+def parse_fields(raw):
+    """'a,b.c,b.d' -> {'a': None, 'b': {'c': None, 'd': None}}; None selects everything"""
+    if not raw:
+        return None
+    tree = {}
+    for path in raw.split(','):
+        parts = [part.strip() for part in path.split('.')]
+        if not all(parts):
+            raise FieldError(path)
+        node = tree
+        for part in parts[:-1]:
+            if node.get(part, {}) is None:
+                break  # a parent is already selected whole
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def wants(tree, *path):
+    """Whether a fields tree from parse_fields selects the field at path"""
+    for part in path:
+        if tree is None:
+            return True
+        if part not in tree:
+            return False
+        tree = tree[part]
+    return True
+
+
+def select(value, tree, path=''):
+    """Trim value to the fields in tree, calling any lazy (callable) section that is kept"""
+    if callable(value):
+        value = value()
+    if isinstance(value, list):
+        return [select(item, tree, path) for item in value]
+    if tree is None:
+        if isinstance(value, dict):
+            return {key: select(item, None, f'{path}{key}.') for key, item in value.items()}
+        return value
+    if not isinstance(value, dict):
+        raise FieldError(path.rstrip('.'))
+    selected = {}
+    for key, subtree in tree.items():
+        if key not in value:
+            raise FieldError(f'{path}{key}')
+        selected[key] = select(value[key], subtree, f'{path}{key}.')
+    return selected
+
+
+def api_role_required(role):
+    """Decorator for API views: like auth.admin_required/worker_required, but answering 401/403 in JSON"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_user.is_authenticated:
+                return _error(401, 'Authentication required')
+            if current_user.role != role:
+                return _error(403, f'{role.title()} privileges required')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def json_fields(f):
+    """Decorator encoding the dict a view returns, trimmed to ?fields=
+
+    The view receives the parsed fields tree as `fields` so it can skip work
+    for sections nobody asked for. Apply below conditional, so 304s skip the
+    view entirely.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            fields = parse_fields(request.args.get('fields'))
+            result = f(*args, fields=fields, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return _json_response(select(result, fields))
+        except FieldError as e:
+            return _error(400, 'Unknown field', field=str(e))
+    return decorated_function
+
+
+# Serializers
+
+def _worker(user):
+    return {'id': user.id, 'name': user.get_full_name()}
+
+
+def _approval(completion):
+    return {
+        'id': completion.id,
+        'task': {'id': completion.task.id, 'title': completion.task.title, 'value': completion.value},
+        'worker': _worker(completion.worker),
+        'completion_date': completion.completion_date,
+        'submitted_at': completion.submitted_at
+    }
+
+
+def _activity_totals(activity_data):
+    return {key: value for key, value in activity_data.items() if key != 'completions'}
+
+
+def _line_item(item):
+    return {
+        'task_title': item['task_title'],
+        'completion_date': item['completion_date'],
+        'value': item['value'],
+        'status': item['status'],
+        'submitted_at': item['submitted_date'],
+        'reviewed_at': item['reviewed_date']
+    }
+
+
+# Views
+
+@bp.route('/worker/stats')
+@api_role_required('worker')
+@conditional
+@json_fields
+def api_worker_stats(fields):
+    return get_worker_stats(current_user.id)
+
+
+@bp.route('/admin/workers/<int:worker_id>/stats')
+@api_role_required('admin')
+@conditional
+@json_fields
+def api_admin_worker_stats(worker_id, fields):
+    if not owns_worker(worker_id):
+        return _error(404, 'Worker not found')
+    return get_worker_stats(worker_id)
+
+
+@bp.route('/admin/dashboard')
+@api_role_required('admin')
+@conditional
+@json_fields
+def api_admin_dashboard(fields):
+    snapshot = get_admin_dashboard_snapshot(current_user.id)
+    workers = []
+    for worker in snapshot.workers:
+        payments = snapshot.worker_payment_data[worker.id]
+        workers.append({
+            **_worker(worker),
+            'approved_count': payments.approved_count,
+            'approved_total': payments.approved_total,
+            'paid_count': payments.paid_count,
+            'paid_total': payments.paid_total,
+            'unpaid': [{
+                'id': completion.id,
+                'task_title': completion.task.title,
+                'completion_date': completion.completion_date,
+                'value': completion.value
+            } for completion in payments.unpaid_tasks]
+        })
+    return {
+        'pending_count': snapshot.pending_count,
+        'awaiting_payment_total': snapshot.awaiting_payment_total,
+        'active_tasks': snapshot.active_tasks,
+        'week_total': snapshot.week_total,
+        'workers': workers
+    }
+
+
+@bp.route('/admin/approvals')
+@api_role_required('admin')
+@conditional
+@json_fields
+def api_approvals(fields):
+    page = []
+
+    def load_page():
+        if not page:
+            page.extend(get_pending_approvals_page(current_user.id, request.args.get('cursor')))
+        return page
+
+    return {
+        'pending_count': lambda: count_pending_approvals(current_user.id),
+        'items': lambda: [_approval(completion) for completion in load_page()[0]],
+        'next_cursor': lambda: load_page()[1]
+    }
+
+
+@bp.route('/admin/reports')
+@api_role_required('admin')
+@conditional
+@json_fields
+def api_reports(fields):
+    # The report page's form validates the filters; dates default to this week
+    start_of_week, end_of_week = get_week_dates()
+    formdata = request.args.copy()
+    formdata.setdefault('start_date', start_of_week.isoformat())
+    formdata.setdefault('end_date', end_of_week.isoformat())
+    formdata.setdefault('worker_id', '-1')
+    form = ReportForm(formdata=formdata, meta={'csrf': False})
+    workers = User.query.filter_by(admin_id=current_user.id, role='worker', is_active=True).all()
+    form.worker_id.choices = [(-1, 'All Workers')] + [(w.id, w.get_full_name()) for w in workers]
+    if not form.validate():
+        return _error(400, 'Invalid report filters', errors=form.errors)
+
+    start_date, end_date = form.start_date.data, form.end_date.data
+    filters = (form.status_filter.data, form.priority_filter.data, form.task_status_filter.data)
+    include_completions = wants(fields, 'workers', 'completions')
+
+    if form.worker_id.data == -1:
+        report_data = get_all_admin_activity(current_user.id, start_date, end_date, *filters, include_completions=include_completions)
+        activity = [(data['worker'], data['activity_data']) for data in report_data['workers'].values()]
+        totals = {
+            'count': sum(activity_data['count'] for _, activity_data in activity),
+            'total_value': report_data['grand_total_value'],
+            'approved_total': report_data['grand_approved_total'],
+            'paid_total': report_data['grand_paid_total'],
+            'awaiting_payment': report_data['grand_awaiting_payment'],
+            'rejected_total': report_data['grand_rejected_total']
+        }
+    else:
+        worker = next(w for w in workers if w.id == form.worker_id.data)
+        activity_data = get_all_worker_activity(worker.id, start_date, end_date, *filters)
+        activity = [(worker, activity_data)]
+        totals = _activity_totals(activity_data)
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'filters': dict(zip(('status_filter', 'priority_filter', 'task_status_filter'), filters)),
+        'totals': totals,
+        'workers': [{
+            **_worker(worker),
+            **_activity_totals(activity_data),
+            'completions': [_line_item(item) for item in activity_data['completions']]
+        } for worker, activity_data in activity]
+    }
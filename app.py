@@ -6,52 +6,131 @@ from flask_login import LoginManager
 from werkzeug.middleware.proxy_fix import ProxyFix
 from sqlalchemy.orm import DeclarativeBase
 
+from db_pool import engine_options
+
 # Configure logging for production
 logging.basicConfig(level=logging.INFO)
 
 class Base(DeclarativeBase):
     pass
 
+# Extensions are bound to each app by create_app(); main.py creates the one the server runs
 db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
 
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-
-# Configure Flask-Mail for Gmail
-app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
-app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", "587"))
-app.config["MAIL_USE_TLS"] = True
-app.config["MAIL_USE_SSL"] = False
-app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
-app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
-app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER")
-
-# Configure Flask-Login
-login_manager.init_app(app)
-login_manager.login_view = 'login'
-login_manager.login_message = 'Please log in to access this page.'
-login_manager.login_message_category = 'warning'
-
-# Initialize the app with the extension
-db.init_app(app)
-
-with app.app_context():
-    # Import models to ensure tables are created
-    import models  # noqa: F401
-    
-    # Initialize Flask-Mail
+
+def load_config(app):
+    """Read the settings from the environment into app.config"""
+    app.config["SECRET_KEY"] = os.environ.get("SESSION_SECRET")
+    # Database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Raise on lazy loads that list queries did not plan for (enable in tests)
+    app.config["STRICT_LOADING"] = os.environ.get("STRICT_LOADING", "false").lower() in ["true", "on", "1"]
+    # Read dashboard and report totals from the earnings rollup (see ledger.py)
+    app.config["EARNINGS_ROLLUP_READS"] = os.environ.get("EARNINGS_ROLLUP_READS", "true").lower() in ["true", "on", "1"]
+    # Read closed weeks from the frozen payout snapshots (see payouts.py)
+    app.config["PAYOUT_SNAPSHOT_READS"] = os.environ.get("PAYOUT_SNAPSHOT_READS", "true").lower() in ["true", "on", "1"]
+    # Cache the logged-in user between requests (see user_cache.py); 0 disables
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", "60"))
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", "1024"))
+    # Optional Redis URL so the worker processes share one cache instead of one each
+    app.config["USER_CACHE_URL"] = os.environ.get("USER_CACHE_URL")
+    # Per-admin task list facet counts (see task_facets.py); 0 disables the cache
+    app.config["TASK_FACETS_CACHE_TTL"] = int(os.environ.get("TASK_FACETS_CACHE_TTL", "300"))
+    app.config["TASK_FACETS_CACHE_SIZE"] = int(os.environ.get("TASK_FACETS_CACHE_SIZE", "1024"))
+    # Rendered dashboard sections, keyed on the household data version (see fragment_cache.py); 0 disables
+    app.config["FRAGMENT_CACHE_TTL"] = int(os.environ.get("FRAGMENT_CACHE_TTL", "3600"))
+    app.config["FRAGMENT_CACHE_SIZE"] = int(os.environ.get("FRAGMENT_CACHE_SIZE", "2048"))
+    app.config["FRAGMENT_CACHE_MAX_BYTES"] = int(os.environ.get("FRAGMENT_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    # ETag/304 for dashboards, reports and history from the per-household data version (see data_version.py)
+    app.config["CONDITIONAL_GET"] = os.environ.get("CONDITIONAL_GET", "true").lower() in ["true", "on", "1"]
+    # Bearer token for the Prometheus /metrics endpoint (see metrics.py); unset disables it
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    # Add a Server-Timing header (app/db time, query count) to every response
+    app.config["SERVER_TIMING"] = os.environ.get("SERVER_TIMING", "false").lower() in ["true", "on", "1"]
+
+    # Outbound email queue (see mail_queue.py)
+    app.config["MAIL_QUEUE_BATCH_SIZE"] = int(os.environ.get("MAIL_QUEUE_BATCH_SIZE", "50"))
+    app.config["MAIL_QUEUE_POLL_SECONDS"] = float(os.environ.get("MAIL_QUEUE_POLL_SECONDS", "5"))
+    app.config["MAIL_QUEUE_MAX_ATTEMPTS"] = int(os.environ.get("MAIL_QUEUE_MAX_ATTEMPTS", "6"))
+    # First retry delay; doubles with each failed attempt
+    app.config["MAIL_QUEUE_RETRY_SECONDS"] = int(os.environ.get("MAIL_QUEUE_RETRY_SECONDS", "60"))
+    # How long a claimed batch may take to send before other workers may claim its messages again
+    app.config["MAIL_QUEUE_LEASE_SECONDS"] = int(os.environ.get("MAIL_QUEUE_LEASE_SECONDS", "600"))
+    app.config["MAIL_QUEUE_WORKER_THREAD"] = os.environ.get("MAIL_QUEUE_WORKER_THREAD", "false").lower() in ["true", "on", "1"]
+    # Workers handled per transaction by the digest-send command (see digests.py)
+    app.config["DIGEST_BATCH_SIZE"] = int(os.environ.get("DIGEST_BATCH_SIZE", "100"))
+
+    # Werkzeug password hash method and parameters; older hashes are upgraded at the next login
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # Failed login limits per window, checked before hashing (see login_throttle.py)
+    app.config["LOGIN_THROTTLE_WINDOW"] = int(os.environ.get("LOGIN_THROTTLE_WINDOW", "900"))
+    app.config["LOGIN_MAX_FAILURES_PER_IP"] = int(os.environ.get("LOGIN_MAX_FAILURES_PER_IP", "20"))
+    app.config["LOGIN_MAX_FAILURES_PER_ACCOUNT"] = int(os.environ.get("LOGIN_MAX_FAILURES_PER_ACCOUNT", "5"))
+
+    # Scheduled weekly reset for every household (see weekly_reset.py); weekday 0 is Monday
+    app.config["WEEKLY_RESET_WEEKDAY"] = int(os.environ.get("WEEKLY_RESET_WEEKDAY", "0"))
+    app.config["WEEKLY_RESET_TIME"] = os.environ.get("WEEKLY_RESET_TIME", "00:05")
+    app.config["WEEKLY_RESET_BATCH_SIZE"] = int(os.environ.get("WEEKLY_RESET_BATCH_SIZE", "50"))
+
+    # Configure Flask-Mail for Gmail
+    app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "smtp.gmail.com")
+    app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", "587"))
+    app.config["MAIL_USE_TLS"] = os.environ.get("MAIL_USE_TLS", "true").lower() in ["true", "on", "1"]
+    app.config["MAIL_USE_SSL"] = False
+    app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
+    app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
+    app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", os.environ.get("MAIL_USERNAME"))
+
+
+def create_app(config=None):
+    """Build an application: settings, extensions, blueprints and request hooks
+
+    config overrides settings read from the environment (tests pass their own
+    database and mail server). Nothing here touches the database; create or
+    migrate the schema with `flask --app main db-upgrade`.
+    """
+    app = Flask(__name__)
+    load_config(app)
+    if config:
+        app.config.update(config)
+    # Pool size, overflow, timeout and the proxy/SQLite profiles come from DB_POOL_*/DB_SQLITE_* (see db_pool.py)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"], os.environ))
+    # Behind one proxy: also trust its X-Forwarded-For so request.remote_addr is the client (login throttling)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+
+    # Configure Flask-Login
+    login_manager.init_app(app)
+    login_manager.login_view = 'main.login'
+    login_manager.login_message = 'Please log in to access this page.'
+    login_manager.login_message_category = 'warning'
+
+    # Engines connect on first use
+    db.init_app(app)
     from email_utils import init_mail
     init_mail(app)
-    
-    db.create_all()
+
+    import models  # noqa: F401
+    import user_cache
+    import task_facets
+    import fragment_cache
+    user_cache.init_app(app)
+    task_facets.init_app(app)
+    fragment_cache.init_app(app)
+
+    from routes import bp as main_bp
+    from api import bp as api_bp
+    from assets import bp as assets_bp
+    from metrics import bp as metrics_bp
+    from mail_queue import bp as mail_queue_bp
+    from migrations import bp as migrations_bp
+    from ledger import bp as ledger_bp
+    from payouts import bp as payouts_bp
+    from digests import bp as digests_bp
+    from weekly_reset import bp as weekly_reset_bp
+    from login_throttle import bp as login_throttle_bp
+    for blueprint in (main_bp, api_bp, assets_bp, metrics_bp, mail_queue_bp, migrations_bp,
+                      ledger_bp, payouts_bp, digests_bp, weekly_reset_bp, login_throttle_bp):
+        app.register_blueprint(blueprint)
+    return app
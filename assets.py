@@ -0,0 +1,231 @@
+"""Fingerprinted, minified and precompressed static assets.
+
+The build step minifies every .css file under static/ (.js files are copied
+as they are), writes it to static/dist/ with a content hash in its name, next
+to .gz and .br copies, and records logical name -> hashed name in
+static/dist/manifest.json:
+
+    flask --app main assets-build
+
+Templates link assets with asset_url_for(), a drop-in for url_for('static',
+filename=...) that emits the hashed /assets/ URL once a build exists and
+falls back to the plain static URL otherwise. /assets/ serves only built
+files, picking the .br or .gz copy the client accepts, with a one-year
+immutable Cache-Control: a changed file gets a new name, so browsers never
+need to revalidate.
+
+rcssmin is used for minifying CSS when installed, and brotli for the .br
+copies; without them a conservative built-in CSS minifier is used and no .br
+files are written. JavaScript is not minified (see minify()).
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+import click
+from flask import Blueprint, url_for
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.routing import Rule
+from werkzeug.utils import send_file
+from werkzeug.wrappers import Request
+
+ASSET_PREFIX = '/assets/'
+MINIFIED_TYPES = ('.css', '.js')
+# One year; hashed names change whenever the content does
+MAX_AGE = 365 * 24 * 60 * 60
+
+bp = Blueprint('assets', __name__, cli_group=None)
+
+_manifest = None
+
+
+def _static_dir():
+    # The app's static folder; _AssetMiddleware reads it outside any app context
+    return os.path.join(bp.root_path, 'static')
+
+
+def _dist_dir():
+    return os.path.join(_static_dir(), 'dist')
+
+
+def _manifest_path():
+    return os.path.join(_dist_dir(), 'manifest.json')
+
+
+def get_manifest():
+    """Logical name -> hashed name from the last build, or {} if there is none"""
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(_manifest_path()) as f:
+                _manifest = json.load(f)
+        except FileNotFoundError:
+            _manifest = {}
+    return _manifest
+
+
+# Built-in CSS minifier: whitespace and comments only, never renaming or reordering
+
+_CSS_TOKENS = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?\*/|\s+|[^"\'/\s]+|/', re.S)
+_CSS_TIGHT = set('{};,>')
+
+
+def _minify_css_builtin(source):
+    out = []
+    for token in _CSS_TOKENS.findall(source):
+        if token.startswith('/*'):
+            continue
+        if token.isspace():
+            if out and out[-1] != ' ':
+                out.append(' ')
+            continue
+        out.append(token)
+
+    # Drop spaces next to punctuation that does not need them, and the last ; of each block
+    result = []
+    for i, token in enumerate(out):
+        if token == ' ':
+            before = result[-1][-1] if result else ''
+            after = out[i + 1][0] if i + 1 < len(out) else ''
+            if not before or not after or before in _CSS_TIGHT or after in _CSS_TIGHT or before == ':':
+                continue
+        if token.startswith('}') and result and result[-1].endswith(';'):
+            result[-1] = result[-1][:-1]
+        result.append(token)
+    return ''.join(result).strip()
+
+
+def minify(name, source):
+    """Minify CSS source (with rcssmin when installed); JavaScript is returned unchanged"""
+    if name.endswith('.css'):
+        try:
+            import rcssmin
+        except ImportError:
+            return _minify_css_builtin(source)
+        return rcssmin.cssmin(source)
+    # JavaScript is copied as is: telling a regular expression from a division, or
+    # the end of a nested template literal, takes a full parser (rjsmin cuts
+    # `a ${`b // c`}` short at the //), and gzip recovers most of the savings
+    return source
+
+
+def _hashed_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    root, ext = os.path.splitext(name)
+    return f'{root}.{digest}{ext}'
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def build():
+    """Build every static .css/.js file into static/dist, returning the new manifest
+
+    Files from earlier builds are left in place so pages rendered before a
+    deploy can still load them.
+    """
+    global _manifest
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    dist = _dist_dir()
+    manifest = {}
+    for root, dirs, files in os.walk(_static_dir()):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for filename in sorted(files):
+            if not filename.endswith(MINIFIED_TYPES):
+                continue
+            source_path = os.path.join(root, filename)
+            name = os.path.relpath(source_path, _static_dir()).replace(os.sep, '/')
+            with open(source_path, encoding='utf-8') as f:
+                content = minify(name, f.read()).encode('utf-8')
+
+            hashed = _hashed_name(name, content)
+            target = os.path.join(dist, hashed)
+            _write(target, content)
+            _write(target + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write(target + '.br', brotli.compress(content, quality=11))
+            manifest[name] = hashed
+
+    _write(_manifest_path(), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    _manifest = manifest
+    return manifest
+
+
+@bp.app_template_global()
+def asset_url_for(endpoint, **values):
+    """url_for() that points built static files at their hashed /assets/ URL"""
+    if endpoint == 'static' and values.get('filename') in get_manifest():
+        values['filename'] = get_manifest()[values['filename']]
+        return url_for('asset', **values)
+    return url_for(endpoint, **values)
+
+
+def _asset_response(filename, request):
+    if filename not in set(get_manifest().values()):
+        return NotFound()
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    dist = _dist_dir()
+    encoding = None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.exists(os.path.join(dist, filename + suffix)):
+            encoding = candidate
+            filename += suffix
+            break
+
+    response = send_file(os.path.join(dist, filename), request.environ, mimetype=mimetype, max_age=MAX_AGE)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+class _AssetMiddleware:
+    """Serves /assets/ ahead of Flask, so asset responses never touch the session
+
+    (Flask-Login reads the session after every request, which would add
+    Vary: Cookie and stop browsers reusing the cached files across logins.)
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(ASSET_PREFIX):
+            return self.wsgi_app(environ, start_response)
+        request = Request(environ)
+        if request.method not in ('GET', 'HEAD'):
+            return MethodNotAllowed(valid_methods=['GET', 'HEAD'])(environ, start_response)
+        return _asset_response(path[len(ASSET_PREFIX):], request)(environ, start_response)
+
+
+@bp.record_once
+def _install(state):
+    # url_for('asset', filename=...) builds the URL; _AssetMiddleware answers it
+    state.app.url_map.add(Rule(f'{ASSET_PREFIX}<path:filename>', endpoint='asset', build_only=True))
+    state.app.wsgi_app = _AssetMiddleware(state.app.wsgi_app)
+
+
+@bp.cli.command('assets-build')
+def assets_build_command():
+    """Minify the static CSS, then fingerprint and precompress it and the JavaScript."""
+    manifest = build()
+    for name, hashed in sorted(manifest.items()):
+        click.echo(f'{name} -> dist/{hashed}')
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        click.echo('brotli is not installed; only .gz copies were written.')
@@ -0,0 +1,132 @@
+"""Record query plans and timings for the hot query paths, before and after
+the composite indexes from migrations.HOT_PATH_INDEXES.
+
+The SQL is captured from the real utils.py functions, then EXPLAINed with
+the same parameters. The hot path indexes are dropped for the "before" run
+and recreated afterwards, so point DATABASE_URL at a benchmark copy, never at
+production:
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/query_plans.py --output plans.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from migrations import HOT_PATH_INDEXES, create_indexes, drop_indexes  # noqa: E402
+import utils  # noqa: E402
+from seed import pick_subjects  # noqa: E402
+
+FULL_SCAN_MARKERS = ('SCAN task_completions', 'Seq Scan on task_completions')
+
+
+def workloads(admin_id, worker_id):
+    today = datetime.now(timezone.utc).date()
+    start_date, end_date = today - timedelta(days=365), today
+    return {
+        'get_worker_stats': lambda: utils.get_worker_stats(worker_id),
+        'get_all_worker_activity': lambda: utils.get_all_worker_activity(worker_id, start_date, end_date),
+        'get_all_admin_activity': lambda: utils.get_all_admin_activity(admin_id, start_date, end_date),
+        'get_admin_dashboard_snapshot': lambda: utils.get_admin_dashboard_snapshot(admin_id),
+        'get_pending_approvals': lambda: utils.get_pending_approvals(admin_id),
+    }
+
+
+def capture_statements(fn):
+    """Run fn once and return the (sql, parameters) pairs it executed"""
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+    
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    db.session.rollback()
+    return statements
+
+
+def explain(statement, parameters):
+    """Return the plan for one statement as a list of text lines"""
+    prefix = 'EXPLAIN QUERY PLAN ' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN '
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def time_workload(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+        db.session.rollback()
+    return statistics.median(timings)
+
+
+def run_phase(subject_workloads, repeat):
+    results = {}
+    for name, fn in subject_workloads.items():
+        plans = [
+            {'sql': statement, 'plan': explain(statement, parameters)}
+            for statement, parameters in capture_statements(fn)
+        ]
+        results[name] = {
+            'median_ms': round(time_workload(fn, repeat), 3),
+            'full_scans': sum(
+                any(marker in line for marker in FULL_SCAN_MARKERS for line in plan['plan'])
+                for plan in plans
+            ),
+            'plans': plans,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='query_plans.json', help='JSON file to write results to')
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per workload')
+    args = parser.parse_args()
+    
+    with create_app().app_context():
+        admin_id, worker_id = pick_subjects()
+        subject_workloads = workloads(admin_id, worker_id)
+        try:
+            drop_indexes(HOT_PATH_INDEXES)
+            before = run_phase(subject_workloads, args.repeat)
+        finally:
+            create_indexes(HOT_PATH_INDEXES)
+        after = run_phase(subject_workloads, args.repeat)
+        
+        report = {
+            'generated_at': datetime.now(timezone.utc).isoformat(),
+            'dialect': db.engine.dialect.name,
+            'admin_id': admin_id,
+            'worker_id': worker_id,
+            'workloads': {
+                name: {'before': before[name], 'after': after[name]}
+                for name in subject_workloads
+            },
+        }
+    
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    
+    for name, phases in report['workloads'].items():
+        print(f"{name:<32} {phases['before']['median_ms']:>9.2f} ms -> {phases['after']['median_ms']:>9.2f} ms"
+              f"  (full scans {phases['before']['full_scans']} -> {phases['after']['full_scans']})")
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""Fill a database with a synthetic household dataset for benchmarking.
+
+Creates admins, their workers and tasks, and a history of TaskCompletion rows
+with a realistic status mix: recent weeks are mostly pending or approved,
+older work is mostly paid with some rejections. The earnings rollup is
+rebuilt afterwards so rollup reads see the same data.
+
+--reset drops every table first, so point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/seed.py --size medium --reset
+    DATABASE_URL=sqlite:///bench.db python benchmarks/seed.py --admins 3 --workers 8 --years 2
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, time as day_time, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, insert  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from models import User, Task, TaskCompletion  # noqa: E402
+import ledger  # noqa: E402
+import migrations  # noqa: E402
+
+# Named dataset sizes: admins, workers per admin, tasks per admin, years of history, completions per worker per day
+SIZES = {
+    'small': {'admins': 2, 'workers': 3, 'tasks': 10, 'years': 0.25, 'per_day': 2},
+    'medium': {'admins': 5, 'workers': 5, 'tasks': 20, 'years': 1, 'per_day': 3},
+    'large': {'admins': 10, 'workers': 10, 'tasks': 30, 'years': 3, 'per_day': 3},
+}
+
+PASSWORD = 'benchmark'
+CATEGORIES = [None, 'Kitchen', 'Garden', 'Laundry', 'Bathroom', 'Errands']
+PRIORITIES = ['low', 'normal', 'high']
+
+# (max age in days, status weights) - first matching band wins
+STATUS_MIX = [
+    (7, {'pending': 70, 'approved': 25, 'rejected': 5}),
+    (28, {'pending': 30, 'approved': 45, 'paid': 15, 'rejected': 10}),
+    (None, {'paid': 85, 'approved': 3, 'rejected': 12}),
+]
+
+INSERT_BATCH = 5000
+
+
+def reset_schema():
+    """Drop every table and recreate the schema through the migration runner"""
+    db.drop_all()
+    migrations.upgrade()
+
+
+def pick_subjects():
+    """Pick the worker with the most completions and their admin"""
+    row = db.session.query(TaskCompletion.worker_id, func.count(TaskCompletion.id)).group_by(
+        TaskCompletion.worker_id
+    ).order_by(func.count(TaskCompletion.id).desc()).first()
+    worker = db.session.get(User, row[0]) if row else User.query.filter_by(role='worker').first()
+    if worker is None:
+        sys.exit('No workers in the database; seed it first.')
+    return worker.admin_id, worker.id
+
+
+def _status_for_age(rng, age_days):
+    for max_age, weights in STATUS_MIX:
+        if max_age is None or age_days <= max_age:
+            return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def seed(admins, workers, tasks, years, per_day, random_seed=0):
+    """Insert a synthetic dataset and return row counts by table"""
+    rng = random.Random(random_seed)
+    password_hash = generate_password_hash(PASSWORD)
+    today = datetime.now(timezone.utc).date()
+    days = max(1, int(years * 365))
+
+    # Emails must be unique across runs into the same database
+    run = int(time.time())
+    admin_users, tasks_by_admin, workers_by_admin = [], {}, {}
+    for a in range(admins):
+        admin = User(email=f'bench-{run}-admin{a}@example.com', first_name='Admin', last_name=str(a),
+                     role='admin', password_hash=password_hash)
+        db.session.add(admin)
+        admin_users.append(admin)
+    db.session.flush()
+
+    for a, admin in enumerate(admin_users):
+        workers_by_admin[admin.id] = [
+            User(email=f'bench-{run}-worker{a}-{w}@example.com', first_name='Worker', last_name=f'{a}-{w}',
+                 role='worker', admin_id=admin.id, password_hash=password_hash,
+                 is_active=not (workers > 2 and w == workers - 1))
+            for w in range(workers)
+        ]
+        tasks_by_admin[admin.id] = [
+            Task(title=f'Task {t}', description=f'Synthetic task {t}',
+                 monetary_value=Decimal(rng.randrange(100, 2500)) / 100,
+                 category=rng.choice(CATEGORIES), priority=rng.choice(PRIORITIES),
+                 is_active=rng.random() > 0.1, created_by=admin.id)
+            for t in range(tasks)
+        ]
+        db.session.add_all(workers_by_admin[admin.id] + tasks_by_admin[admin.id])
+    db.session.flush()
+
+    completion_count = 0
+    batch = []
+    for admin in admin_users:
+        task_ids = [task.id for task in tasks_by_admin[admin.id]]
+        for worker in workers_by_admin[admin.id]:
+            for age in range(days):
+                day = today - timedelta(days=age)
+                for task_id in rng.sample(task_ids, min(per_day, len(task_ids))):
+                    status = _status_for_age(rng, age)
+                    submitted_at = datetime.combine(day, day_time(hour=rng.randrange(7, 22), minute=rng.randrange(60)))
+                    reviewed = status != 'pending'
+                    batch.append({
+                        'task_id': task_id,
+                        'worker_id': worker.id,
+                        'completion_date': day,
+                        'status': status,
+                        'admin_notes': 'Please redo' if status == 'rejected' else None,
+                        'submitted_at': submitted_at,
+                        'reviewed_at': submitted_at + timedelta(hours=rng.randrange(1, 72)) if reviewed else None,
+                        'reviewed_by': admin.id if reviewed else None,
+                    })
+                    if len(batch) >= INSERT_BATCH:
+                        db.session.execute(insert(TaskCompletion), batch)
+                        completion_count += len(batch)
+                        batch = []
+    if batch:
+        db.session.execute(insert(TaskCompletion), batch)
+        completion_count += len(batch)
+    db.session.commit()
+
+    rollup_rows = ledger.rebuild()
+    return {
+        'admins': admins,
+        'workers': admins * workers,
+        'tasks': admins * tasks,
+        'task_completions': completion_count,
+        'earnings_rollups': rollup_rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help='named dataset size')
+    parser.add_argument('--admins', type=int, help='override the number of admins')
+    parser.add_argument('--workers', type=int, help='override workers per admin')
+    parser.add_argument('--tasks', type=int, help='override tasks per admin')
+    parser.add_argument('--years', type=float, help='override years of completion history')
+    parser.add_argument('--per-day', type=int, help='override completions per worker per day')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    params = dict(SIZES[args.size])
+    for name in params:
+        override = getattr(args, name)
+        if override is not None:
+            params[name] = override
+
+    with create_app().app_context():
+        if args.reset:
+            reset_schema()
+        started = time.perf_counter()
+        counts = seed(random_seed=args.seed, **params)
+
+    print(', '.join(f'{count} {table}' for table, count in counts.items()) +
+          f' in {time.perf_counter() - started:.1f}s (password: {PASSWORD})')
+
+
+if __name__ == '__main__':
+    main()
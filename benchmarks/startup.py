@@ -0,0 +1,120 @@
+"""Measure cold start: importing the app in a fresh interpreter and serving its first request.
+
+Each run starts a new Python process that imports main (as gunicorn, the
+flask CLI and every preload-less worker do), then serves one GET through the
+test client. Reported per run: total process wall time, import time, first
+request time, and the number of SQL statements executed while importing
+(expected: 0). Results (median and p95) are written as JSON; pass an earlier
+results file with --compare to print the change.
+
+The database is never written to and need not have a schema:
+
+    DATABASE_URL=sqlite:///startup.db python benchmarks/startup.py --output startup.json
+    DATABASE_URL=sqlite:///startup.db python benchmarks/startup.py --compare startup.json --output startup-new.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+import main
+imported = time.perf_counter()
+import_statements = len(statements)
+response = main.app.test_client().get({path!r})
+served = time.perf_counter()
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000,
+    'first_request_ms': (served - imported) * 1000,
+    'import_queries': import_statements,
+    'status': response.status_code,
+}}))
+'''
+
+METRICS = ('total_ms', 'import_ms', 'first_request_ms', 'import_queries')
+
+
+def run_once(path):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE.format(root=ROOT, path=path)],
+        capture_output=True, text=True, check=True, env=os.environ.copy()
+    )
+    total_ms = (time.perf_counter() - started) * 1000
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['total_ms'] = total_ms
+    return result
+
+
+def summarize(runs):
+    summary = {}
+    for metric in METRICS:
+        values = sorted(run[metric] for run in runs)
+        summary[metric] = {
+            'median': statistics.median(values),
+            'p95': values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))],
+        }
+    summary['statuses'] = sorted({run['status'] for run in runs})
+    return summary
+
+
+def print_comparison(summary, previous):
+    print(f'\nvs {previous.get("generated_at", "previous run")}')
+    for metric in METRICS:
+        before = previous.get('summary', {}).get(metric)
+        if not before:
+            continue
+        now = summary[metric]['median']
+        change = (now - before['median']) / before['median'] * 100 if before['median'] else 0
+        print(f"  {metric:<18} {before['median']:>9.2f} -> {now:>9.2f} ({change:+6.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='cold starts to time')
+    parser.add_argument('--path', default='/login', help='URL of the first request')
+    parser.add_argument('--output', default='startup_results.json', help='JSON file to write results to')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    # One untimed run warms the filesystem cache and writes bytecode
+    run_once(args.path)
+    runs = [run_once(args.path) for _ in range(args.repeat)]
+    summary = summarize(runs)
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'repeat': args.repeat,
+        'path': args.path,
+        'python': sys.version.split()[0],
+        'summary': summary,
+        'runs': runs,
+    }
+
+    for metric in METRICS:
+        print(f"  {metric:<18} median {summary[metric]['median']:>9.2f}  p95 {summary[metric]['p95']:>9.2f}")
+    print(f"  first request status {', '.join(str(status) for status in summary['statuses'])}")
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            print_comparison(summary, json.load(fh))
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""Time the utils.py read functions and the main routes at several data sizes.
+
+For each size the database is reset and reseeded (see seed.py), then every
+workload runs --repeat times. Routes go through the Flask test client logged
+in as the busiest worker or their admin. Results (median and p95 latency,
+SQL statements per call) are written as JSON; pass an earlier results file
+with --compare to print the change per workload.
+
+Every size drops all tables, so point DATABASE_URL at a scratch database:
+
+    DATABASE_URL=sqlite:///bench.db python benchmarks/suite.py --sizes small,medium --output bench.json
+    DATABASE_URL=sqlite:///bench.db python benchmarks/suite.py --compare bench.json --output bench-new.json
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+import user_cache  # noqa: E402
+import fragment_cache  # noqa: E402
+import utils  # noqa: E402
+from seed import SIZES, pick_subjects, reset_schema, seed  # noqa: E402
+
+app = create_app()
+
+
+def utils_workloads(admin_id, worker_id):
+    today = datetime.now(timezone.utc).date()
+    week_start, week_end = utils.get_week_dates()
+    year_start = today - timedelta(days=365)
+    return {
+        'get_worker_stats': lambda: utils.get_worker_stats(worker_id),
+        'get_worker_payment_summary': lambda: utils.get_worker_payment_summary(worker_id),
+        'calculate_worker_payment': lambda: utils.calculate_worker_payment(worker_id, week_start, week_end),
+        'calculate_worker_paid_earnings': lambda: utils.calculate_worker_paid_earnings(worker_id),
+        'get_all_worker_activity': lambda: utils.get_all_worker_activity(worker_id, year_start, today),
+        'get_completion_history_page': lambda: utils.get_completion_history_page(worker_id),
+        'get_completion_history_summary': lambda: utils.get_completion_history_summary(worker_id),
+        'calculate_admin_payments': lambda: utils.calculate_admin_payments(admin_id, week_start, week_end),
+        'get_all_admin_activity': lambda: utils.get_all_admin_activity(admin_id, year_start, today),
+        'get_all_admin_activity_filtered': lambda: utils.get_all_admin_activity(
+            admin_id, year_start, today, priority_filter='high'
+        ),
+        'iter_activity_line_items': lambda: list(utils.iter_activity_line_items([worker_id], year_start, today)),
+        'get_pending_approvals': lambda: utils.get_pending_approvals(admin_id),
+        'get_pending_approvals_page': lambda: utils.get_pending_approvals_page(admin_id),
+        'count_pending_approvals': lambda: utils.count_pending_approvals(admin_id),
+        'get_approved_tasks_for_payment': lambda: utils.get_approved_tasks_for_payment(admin_id),
+        'get_admin_dashboard_snapshot': lambda: utils.get_admin_dashboard_snapshot(admin_id),
+    }
+
+
+def route_workloads(admin_id, worker_id):
+    today = datetime.now(timezone.utc).date()
+    year = f'start_date={today - timedelta(days=365)}&end_date={today}'
+    return {
+        'admin_dashboard': (admin_id, '/admin'),
+        'approval_queue': (admin_id, '/admin/approvals'),
+        'reports': (admin_id, '/admin/reports'),
+        'export_report': (admin_id, f'/admin/reports/export?{year}'),
+        'export_report_line_items': (admin_id, f'/admin/reports/export?{year}&detail=line_items'),
+        'export_report_worker': (admin_id, f'/admin/reports/export?{year}&worker_id={worker_id}'),
+        'worker_dashboard': (worker_id, '/worker'),
+        'completion_history': (worker_id, '/worker/history'),
+    }
+
+
+class _StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def measure(fn, repeat, engine):
+    """Run fn repeat times, returning latency percentiles and statements per call"""
+    counter = _StatementCounter()
+    event.listen(engine, 'before_cursor_execute', counter)
+    timings = []
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter)
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'queries': round(counter.count / repeat, 1),
+    }
+
+
+def _utils_call(fn):
+    def call():
+        fn()
+        db.session.rollback()
+    return call
+
+
+def _route_call(client, path):
+    def call():
+        response = client.get(path)
+        if response.status_code != 200:
+            raise RuntimeError(f'GET {path} returned {response.status_code}')
+        response.get_data()
+    return call
+
+
+def run_size(name, repeat, random_seed):
+    with app.app_context():
+        engine = db.engine
+        reset_schema()
+        # Ids and household versions restart after a reset, so drop what was cached for the previous size
+        user_cache.clear()
+        fragment_cache.clear()
+        dataset = seed(random_seed=random_seed, **SIZES[name])
+        admin_id, worker_id = pick_subjects()
+        utils_results = {
+            workload: measure(_utils_call(fn), repeat, engine)
+            for workload, fn in utils_workloads(admin_id, worker_id).items()
+        }
+
+    # Requests run outside any app context so each gets its own g and session, as in production
+    clients = {}
+    for user_id in (admin_id, worker_id):
+        clients[user_id] = app.test_client()
+        with clients[user_id].session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+    route_results = {
+        workload: measure(_route_call(clients[user_id], path), repeat, engine)
+        for workload, (user_id, path) in route_workloads(admin_id, worker_id).items()
+    }
+    return {'dataset': dataset, 'utils': utils_results, 'routes': route_results}
+
+
+def print_comparison(report, previous):
+    for size, results in report['sizes'].items():
+        before_size = previous.get('sizes', {}).get(size)
+        if not before_size:
+            continue
+        print(f'\n{size} (vs {previous.get("generated_at", "previous run")})')
+        for group in ('utils', 'routes'):
+            for workload, now in results[group].items():
+                before = before_size.get(group, {}).get(workload)
+                if not before:
+                    continue
+                change = (now['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+                print(f"  {workload:<34} {before['median_ms']:>9.2f} -> {now['median_ms']:>9.2f} ms ({change:+6.1f}%)"
+                      f"  queries {before['queries']:g} -> {now['queries']:g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium', help=f'comma-separated sizes from {", ".join(SIZES)}')
+    parser.add_argument('--repeat', type=int, default=10, help='timed runs per workload')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the datasets')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file to write results to')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f'unknown size(s): {", ".join(unknown)}')
+
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'repeat': args.repeat,
+        'sizes': {},
+    }
+    with app.app_context():
+        report['dialect'] = db.engine.dialect.name
+
+    for size in sizes:
+        started = time.perf_counter()
+        report['sizes'][size] = run_size(size, args.repeat, args.seed)
+        print(f"{size}: {report['sizes'][size]['dataset']['task_completions']} completions, "
+              f'{time.perf_counter() - started:.1f}s')
+        for group in ('utils', 'routes'):
+            for workload, result in report['sizes'][size][group].items():
+                print(f"  {workload:<34} {result['median_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms"
+                      f"  queries {result['queries']:g}")
+
+    with open(args.output, 'w') as fh:
+        json.dump(report, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            print_comparison(report, json.load(fh))
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
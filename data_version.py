@@ -0,0 +1,118 @@
+"""Per-household data versions and conditional GET.
+
+Every write to an admin's tasks, workers or completions calls bump() in the
+same transaction, so household_versions holds a counter that changes whenever
+anything an admin or their workers can see changes. Read routes wrapped in
+@conditional derive a weak ETag and Last-Modified from that counter and answer
+a repeat request with 304 Not Modified after one primary-key read, without
+running the view or any of the dashboard and report queries.
+
+The ETag also covers the URL, the user, the current (UTC) day, so "this week"
+pages roll over, and the CSRF session token, so a page revalidated from the
+browser cache still carries a form token that is accepted. Responses that show
+flashed messages are never given an ETag.
+"""
+import hashlib
+from datetime import datetime, time, timezone
+from functools import wraps
+
+from flask import current_app, g, request, session, make_response
+from flask.globals import request_ctx
+from flask_login import current_user
+
+from app import db
+from models import HouseholdVersion
+from db_upsert import insert_for_dialect
+
+
+def household_id(user):
+    """The admin whose data a user's pages show"""
+    return user.id if user.is_admin() else user.admin_id
+
+
+def bump(admin_id):
+    """Mark an admin's household data as changed; the caller commits"""
+    if admin_id is None:
+        return
+    g.pop('household_versions', None)
+    now = datetime.now(timezone.utc)
+    table = HouseholdVersion.__table__
+    insert = insert_for_dialect()
+    if insert is not None:
+        statement = insert(table).values(admin_id=admin_id, version=1, updated_at=now)
+        statement = statement.on_conflict_do_update(
+            index_elements=['admin_id'],
+            set_={'version': table.c.version + 1, 'updated_at': now}
+        )
+        db.session.execute(statement)
+        return
+
+    row = db.session.get(HouseholdVersion, admin_id, with_for_update=True)
+    if row is None:
+        db.session.add(HouseholdVersion(admin_id=admin_id, version=1, updated_at=now))
+    else:
+        row.version += 1
+        row.updated_at = now
+
+
+def current(admin_id):
+    """(version, updated_at) for a household; version 0 if it has never been written
+
+    Read once per request: the ETag check and cached fragments share it.
+    """
+    versions = g.setdefault('household_versions', {})
+    if admin_id not in versions:
+        row = db.session.query(HouseholdVersion.version, HouseholdVersion.updated_at).filter(
+            HouseholdVersion.admin_id == admin_id
+        ).first()
+        if row is None:
+            versions[admin_id] = (0, None)
+        else:
+            updated_at = row.updated_at.replace(tzinfo=timezone.utc) if row.updated_at.tzinfo is None else row.updated_at
+            versions[admin_id] = (row.version, updated_at)
+    return versions[admin_id]
+
+
+def _validators(admin_id):
+    version, updated_at = current(admin_id)
+    now = datetime.now(timezone.utc)
+    today = now.date()
+    # Flask-WTF tokens expire WTF_CSRF_TIME_LIMIT seconds after they are issued
+    csrf_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 0
+    csrf_period = int(now.timestamp() // csrf_limit) if csrf_limit else 0
+    key = '|'.join(str(part) for part in (
+        request.full_path, current_user.id, admin_id, version, today, session.get('csrf_token', ''), csrf_period
+    ))
+    etag = hashlib.sha1(key.encode()).hexdigest()
+    last_modified = datetime.combine(today, time.min, tzinfo=timezone.utc)
+    if updated_at is not None and updated_at > last_modified:
+        last_modified = updated_at
+    return etag, last_modified.replace(microsecond=0)
+
+
+def conditional(f):
+    """Answer repeat GETs of a household page with 304 while its data version is unchanged
+
+    Apply below the login/role decorator, so current_user is known.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if (not current_app.config['CONDITIONAL_GET'] or request.method != 'GET'
+                or '_flashes' in session or household_id(current_user) is None):
+            return f(*args, **kwargs)
+
+        etag, last_modified = _validators(household_id(current_user))
+        # Only the ETag is trusted for 304s: If-Modified-Since cannot tell two users' pages apart
+        if request.if_none_match.contains_weak(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            # Pages showing flashed messages must not be replayed from the browser cache
+            if response.status_code != 200 or '_flashes' in session or request_ctx.flashes:
+                return response
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        # Cache privately, but revalidate on every view
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return decorated_function
@@ -0,0 +1,237 @@
+"""Database connection pool settings and statistics.
+
+engine_options() builds SQLALCHEMY_ENGINE_OPTIONS from the environment in
+one of three profiles:
+
+- queue (default): a per-process QueuePool of DB_POOL_SIZE connections plus
+  up to DB_MAX_OVERFLOW extra ones under bursts. A request that cannot get a
+  connection within DB_POOL_TIMEOUT seconds fails with 503 and Retry-After
+  instead of piling up behind the pool. Connections are reused newest-first,
+  so surplus ones sit idle and are recycled after DB_POOL_RECYCLE seconds.
+  DB_POOL_PRE_PING=true adds a round trip to every checkout to test the
+  connection first; leave it off unless something between the app and the
+  database drops idle connections sooner than DB_POOL_RECYCLE.
+- proxy (DB_POOL_MODE=proxy): for a transaction-pooling proxy such as
+  PgBouncer. The proxy does the pooling, so the app opens a connection per
+  checkout (NullPool) and never holds server connections between requests;
+  psycopg 3 is told not to prepare statements, which do not survive the
+  proxy handing the next transaction to another server connection.
+- sqlite: picked for sqlite:/// file URLs, for small single-node installs.
+  Each connection turns on WAL (readers no longer block the writer),
+  synchronous=NORMAL, a DB_SQLITE_MMAP_SIZE memory map and a
+  DB_SQLITE_BUSY_TIMEOUT millisecond wait for the write lock.
+  DB_SQLITE_TUNING=false keeps SQLite's defaults.
+
+The pool records checkouts, time spent waiting for a connection, timeouts,
+and how many connections are in use or in overflow; metrics.py serves them
+on /metrics. Like the other metrics they are per process.
+
+This module is imported by app.py before the app exists, so it must not
+import app.
+"""
+import logging
+import sqlite3
+import threading
+import time
+import weakref
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, Pool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+POOL_MODES = ('queue', 'proxy')
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# PRAGMAs run on every new SQLite connection, set by engine_options()
+_sqlite_pragmas = []
+
+
+def _env_bool(env, name, default):
+    return env.get(name, default).lower() in ["true", "on", "1"]
+
+
+def _is_sqlite_file(url):
+    return url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:')
+
+
+def engine_options(database_url, env):
+    """SQLALCHEMY_ENGINE_OPTIONS for database_url, configured from env (os.environ)"""
+    mode = env.get("DB_POOL_MODE", "queue").lower()
+    if mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE must be one of {', '.join(POOL_MODES)}, not {mode!r}")
+    url = make_url(database_url) if database_url else None
+
+    if url is not None and url.get_backend_name() == 'sqlite' and not _is_sqlite_file(url):
+        # In-memory: Flask-SQLAlchemy shares one connection (StaticPool)
+        return {}
+
+    if mode == 'proxy':
+        options = {"poolclass": NullPool}
+        if url is not None and url.get_driver_name() == 'psycopg':
+            options["connect_args"] = {"prepare_threshold": None}
+        return options
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": int(env.get("DB_POOL_SIZE", "5")),
+        "max_overflow": int(env.get("DB_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(env.get("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(env.get("DB_POOL_RECYCLE", "300")),
+        "pool_pre_ping": _env_bool(env, "DB_POOL_PRE_PING", "false"),
+        "pool_use_lifo": True,
+    }
+    if url is not None and _is_sqlite_file(url):
+        # Pooled connections move between threads; the pool never shares one at a time
+        options["connect_args"] = {"check_same_thread": False}
+        # A local file cannot go stale
+        options["pool_pre_ping"] = False
+        if _env_bool(env, "DB_SQLITE_TUNING", "true"):
+            _sqlite_pragmas[:] = [
+                f"PRAGMA busy_timeout = {int(env.get('DB_SQLITE_BUSY_TIMEOUT', '5000'))}",
+                "PRAGMA journal_mode = WAL",
+                "PRAGMA synchronous = NORMAL",
+                f"PRAGMA mmap_size = {int(env.get('DB_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))}",
+            ]
+    return options
+
+
+@event.listens_for(Pool, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not _sqlite_pragmas or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma in _sqlite_pragmas:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+class _PoolStats:
+    """Thread-safe counters shared by every pool in the process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = weakref.WeakSet()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_counts = [0] * len(WAIT_BUCKETS)
+        self.wait_total = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        self.peak_checked_out = 0
+
+    def record_wait(self, seconds):
+        with self._lock:
+            for i, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_counts[i] += 1
+            self.wait_total += 1
+            self.wait_sum += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_checkout(self, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        """Counters plus the current size, checked-out and overflow counts of the live pools"""
+        pools = list(self.pools)
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'timeouts': self.timeouts,
+                'wait_buckets': list(zip(WAIT_BUCKETS, self.wait_counts)),
+                'wait_count': self.wait_total,
+                'wait_sum': self.wait_sum,
+                'wait_max': self.wait_max,
+                'peak_checked_out': self.peak_checked_out,
+                'size': sum(pool.size() for pool in pools),
+                'checked_out': sum(pool.checkedout() for pool in pools),
+                'overflow': sum(max(pool.overflow(), 0) for pool in pools),
+                'idle': sum(pool.checkedin() for pool in pools),
+            }
+
+
+stats = _PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times every checkout and counts the ones that time out"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        stats.pools.add(self)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            stats.record_timeout()
+            stats.record_wait(time.perf_counter() - started)
+            logger.warning('Connection pool exhausted: %s', self.status())
+            raise
+        stats.record_wait(time.perf_counter() - started)
+        stats.record_checkout(self.checkedout())
+        return connection
+
+
+@event.listens_for(Pool, 'connect')
+def _count_connect(dbapi_connection, connection_record):
+    stats.record_connect()
+
+
+@event.listens_for(NullPool, 'checkout')
+def _count_unpooled_checkout(dbapi_connection, connection_record, connection_proxy):
+    # NullPool opens a connection per checkout; there is no queue to time
+    stats.record_checkout(0)
+
+
+def metrics_lines():
+    """The pool statistics in Prometheus text format (see metrics.register_collector)"""
+    snapshot = stats.snapshot()
+    lines = []
+    for name, kind, help_text, value in (
+        ('checkouts_total', 'counter', 'Connections handed out by the pool.', snapshot['checkouts']),
+        ('connects_total', 'counter', 'New database connections opened.', snapshot['connects']),
+        ('timeouts_total', 'counter', 'Checkouts that gave up after DB_POOL_TIMEOUT (pool exhausted).', snapshot['timeouts']),
+        ('size', 'gauge', 'Configured pool size.', snapshot['size']),
+        ('checked_out', 'gauge', 'Connections currently in use.', snapshot['checked_out']),
+        ('overflow', 'gauge', 'Connections currently open beyond the pool size.', snapshot['overflow']),
+        ('idle', 'gauge', 'Connections waiting in the pool.', snapshot['idle']),
+        ('peak_checked_out', 'gauge', 'Most connections in use at once since the process started.', snapshot['peak_checked_out']),
+        ('wait_max_seconds', 'gauge', 'Longest wait for a connection since the process started.', round(snapshot['wait_max'], 6)),
+    ):
+        lines += [
+            f'# HELP tasktracker_db_pool_{name} {help_text}',
+            f'# TYPE tasktracker_db_pool_{name} {kind}',
+            f'tasktracker_db_pool_{name} {value}',
+        ]
+
+    name = 'tasktracker_db_pool_wait_seconds'
+    lines += [f'# HELP {name} Time taken to check out a connection, in seconds.', f'# TYPE {name} histogram']
+    for bound, count in snapshot['wait_buckets']:
+        lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+    lines += [
+        f'{name}_bucket{{le="+Inf"}} {snapshot["wait_count"]}',
+        f'{name}_sum {snapshot["wait_sum"]:.6f}',
+        f'{name}_count {snapshot["wait_count"]}',
+    ]
+    return lines
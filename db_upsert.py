@@ -0,0 +1,23 @@
+"""Dialect-specific INSERT ... ON CONFLICT for tables maintained by upsert.
+
+The earnings ledger (ledger.py), login throttle counters (login_throttle.py)
+and household data versions (data_version.py) all add to a row that may not
+exist yet. insert_for_dialect() gives them the dialect's insert construct,
+which has on_conflict_do_update(); on other databases it returns None and
+each caller falls back to its own read-then-write.
+"""
+from app import db
+
+
+def insert_for_dialect():
+    """The dialect's insert construct with on_conflict_do_update, or None if it has none"""
+    # Imported here: the engine has already loaded its own dialect, and importing
+    # both at startup would pull in the PostgreSQL driver modules for SQLite users
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects import sqlite
+        return sqlite.insert
+    return None
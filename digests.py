@@ -0,0 +1,125 @@
+"""Coalesced approval and payout digest emails.
+
+Approvals, rejections, payments and weekly resets record a NotificationEvent
+in the same transaction as the status change. send_digests() later turns all
+undigested events into one summary email per worker and puts them on the
+mail queue, whose worker delivers them in batches over one SMTP session.
+Run it once per digest period, e.g. daily from cron:
+
+    flask --app main digest-send
+"""
+from datetime import datetime, timezone
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import cast, func, literal, select
+
+from app import db
+from models import Task, TaskCompletion, User, NotificationEvent, PayoutSnapshot
+import ledger
+import mail_queue
+
+bp = Blueprint('digests', __name__, cli_group=None)
+
+EVENTS = ('approved', 'rejected', 'paid', 'reset')
+
+
+def record_change(completion, event):
+    """Record one completion's status change for the worker's next digest
+
+    Completions in closed weeks are priced at their frozen payout snapshot
+    value, as reports show them (with PAYOUT_SNAPSHOT_READS on).
+    """
+    task = completion.task or db.session.get(Task, completion.task_id)
+    amount = task.monetary_value
+    if current_app.config.get('PAYOUT_SNAPSHOT_READS'):
+        amount = ledger.frozen_value(completion.worker_id, completion.completion_date, task.id, amount)
+    db.session.add(NotificationEvent(
+        worker_id=completion.worker_id,
+        completion_id=completion.id,
+        event=event,
+        task_title=task.title,
+        amount=amount,
+        completion_date=completion.completion_date,
+    ))
+
+
+def record_changes(criteria, event):
+    """Record an event for every completion matching criteria in one INSERT ... SELECT
+
+    Call before the set-based UPDATE or DELETE that the event describes.
+    Amounts are priced as in record_change().
+    """
+    amount = Task.monetary_value
+    if current_app.config.get('PAYOUT_SNAPSHOT_READS'):
+        # Any status's snapshot row carries the frozen price; it may already have moved to the new one
+        frozen = select(
+            cast(PayoutSnapshot.amount / PayoutSnapshot.completion_count, Task.monetary_value.type)
+        ).where(
+            PayoutSnapshot.worker_id == TaskCompletion.worker_id,
+            PayoutSnapshot.day == TaskCompletion.completion_date,
+            PayoutSnapshot.task_id == TaskCompletion.task_id,
+            PayoutSnapshot.completion_count > 0
+        ).limit(1).scalar_subquery()
+        amount = func.coalesce(frozen, Task.monetary_value)
+    db.session.execute(
+        NotificationEvent.__table__.insert().from_select(
+            ['worker_id', 'completion_id', 'event', 'task_title', 'amount', 'completion_date', 'created_at'],
+            select(
+                TaskCompletion.worker_id,
+                TaskCompletion.id,
+                literal(event),
+                Task.title,
+                amount,
+                TaskCompletion.completion_date,
+                literal(datetime.now(timezone.utc), NotificationEvent.created_at.type),
+            ).join(Task, TaskCompletion.task_id == Task.id).where(*criteria)
+        )
+    )
+
+
+def send_digests(batch_size=None):
+    """Queue one digest email per worker with undigested events, returning the number queued
+
+    Workers are handled batch_size at a time, each batch in its own transaction.
+    Events for deleted or deactivated workers are marked digested without an email.
+    """
+    from email_utils import build_digest_email
+    batch_size = batch_size or current_app.config['DIGEST_BATCH_SIZE']
+    worker_ids = [
+        worker_id for (worker_id,) in db.session.query(NotificationEvent.worker_id).filter(
+            NotificationEvent.digested_at.is_(None)
+        ).distinct().order_by(NotificationEvent.worker_id).all()
+    ]
+
+    queued = 0
+    for start in range(0, len(worker_ids), batch_size):
+        batch = worker_ids[start:start + batch_size]
+        events = NotificationEvent.query.filter(
+            NotificationEvent.digested_at.is_(None),
+            NotificationEvent.worker_id.in_(batch)
+        ).order_by(NotificationEvent.worker_id, NotificationEvent.id).all()
+        workers = {
+            worker.id: worker
+            for worker in User.query.filter(User.id.in_(batch), User.is_active == True).all()
+        }
+
+        events_by_worker = {}
+        for event in events:
+            events_by_worker.setdefault(event.worker_id, []).append(event)
+        for worker_id, worker_events in events_by_worker.items():
+            if worker_id in workers:
+                mail_queue.enqueue(build_digest_email(workers[worker_id], worker_events))
+                queued += 1
+
+        NotificationEvent.query.filter(NotificationEvent.id.in_([event.id for event in events])).update(
+            {'digested_at': datetime.now(timezone.utc)}, synchronize_session=False
+        )
+        db.session.commit()
+    return queued
+
+
+@bp.cli.command('digest-send')
+def digest_send_command():
+    """Queue a digest email for every worker with new approvals, payments or resets."""
+    click.echo(f'Queued {send_digests()} digest emails.')
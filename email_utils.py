@@ -1,27 +1,18 @@
-import os
-from flask import current_app, url_for
+from flask import current_app, url_for, has_request_context
+from markupsafe import escape
 from flask_mail import Mail, Message
-from app import app
 
 # Initialize Flask-Mail
 mail = Mail()
 
 def init_mail(app):
-    """Initialize Flask-Mail with the app"""
-    # Configure mail settings
-    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', '587'))
-    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
-    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
-    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
-    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME'))
-    
+    """Initialize Flask-Mail with the app (mail settings are read from app.config, see app.py)"""
     mail.init_app(app)
 
 def send_password_reset_email(user, token):
-    """Send password reset email to user"""
+    """Queue a password reset email for the user; delivered by mail_queue once the caller commits"""
     try:
-        reset_url = url_for('reset_password', token=token, _external=True)
+        reset_url = url_for('main.reset_password', token=token, _external=True)
         
         msg = Message(
             subject='Home Task Tracker - Password Reset Request',
@@ -85,8 +76,85 @@ def send_password_reset_email(user, token):
             '''
         )
         
-        mail.send(msg)
+        from mail_queue import enqueue
+        enqueue(msg)
         return True
     except Exception as e:
-        current_app.logger.error(f"Failed to send password reset email: {str(e)}")
-        return False
\ No newline at end of file
+        current_app.logger.error(f"Failed to queue password reset email: {str(e)}")
+        return False
+
+# Digest sections in the order they appear in the email
+DIGEST_SECTIONS = [
+    ('paid', 'Paid'),
+    ('approved', 'Approved - awaiting payment'),
+    ('rejected', 'Rejected'),
+    ('reset', 'Cleared by the weekly reset'),
+]
+
+# Line items shown per section before summarising the rest
+DIGEST_SECTION_LIMIT = 20
+
+def build_digest_email(worker, events):
+    """Build one summary email covering a worker's approval, payment and reset events"""
+    # Outside a request (the digest-send command) links need SERVER_NAME to build
+    can_link = has_request_context() or current_app.config.get('SERVER_NAME')
+    dashboard_url = url_for('main.worker_dashboard', _external=True) if can_link else None
+    
+    html_sections = []
+    text_sections = []
+    for event_name, heading in DIGEST_SECTIONS:
+        section_events = [event for event in events if event.event == event_name]
+        if not section_events:
+            continue
+        total = sum(event.amount for event in section_events)
+        title = f"{heading}: {len(section_events)} task{'s' if len(section_events) != 1 else ''} (£{total:.2f})"
+        shown = section_events[:DIGEST_SECTION_LIMIT]
+        more = len(section_events) - len(shown)
+        
+        rows = ''.join(
+            f'<li>{escape(event.task_title)} - {event.completion_date.strftime("%d/%m/%Y")} - £{event.amount:.2f}</li>'
+            for event in shown
+        )
+        if more:
+            rows += f'<li>and {more} more</li>'
+        html_sections.append(f'<h3 style="color: #495057; margin-bottom: 5px;">{escape(title)}</h3><ul>{rows}</ul>')
+        
+        lines = [f'  - {event.task_title} - {event.completion_date.strftime("%d/%m/%Y")} - £{event.amount:.2f}' for event in shown]
+        if more:
+            lines.append(f'  - and {more} more')
+        text_sections.append(title + '\n' + '\n'.join(lines))
+    
+    dashboard_html = (
+        f'<p><a href="{dashboard_url}" style="color: #007bff;">Open your dashboard</a></p>' if dashboard_url else ''
+    )
+    dashboard_text = f'Open your dashboard: {dashboard_url}\n\n' if dashboard_url else ''
+    
+    return Message(
+        subject='Home Task Tracker - Your task update summary',
+        recipients=[worker.email],
+        html=f'''
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                <h1 style="color: #007bff; text-align: center;">Home Task Tracker</h1>
+                <p>Hello {escape(worker.get_full_name())},</p>
+                <p>Here is what changed with your tasks since your last summary:</p>
+                {''.join(html_sections)}
+                {dashboard_html}
+                <hr style="border: none; border-top: 1px solid #dee2e6; margin: 30px 0;">
+                <p style="font-size: 12px; color: #adb5bd; text-align: center;">
+                    This email was sent from Home Task Tracker. Please do not reply to this email.
+                </p>
+            </div>
+        </body>
+        </html>
+        ''',
+        body=(
+            f'Home Task Tracker - Your task update summary\n\n'
+            f'Hello {worker.get_full_name()},\n\n'
+            f'Here is what changed with your tasks since your last summary:\n\n'
+            + '\n\n'.join(text_sections) + '\n\n'
+            + dashboard_text
+            + 'This email was sent from Home Task Tracker. Please do not reply to this email.\n'
+        )
+    )
@@ -4,6 +4,7 @@ from wtforms.validators import DataRequired, Email, Length, NumberRange, EqualTo
 from wtforms.widgets import TextArea
 from datetime import date
 from models import User
+from utils import TREND_INTERVALS, TREND_GROUPS
 
 class LoginForm(FlaskForm):
     email = StringField('Email', validators=[DataRequired(), Email()], render_kw={"class": "form-control"})
@@ -72,6 +73,16 @@ class ReportForm(FlaskForm):
                                     choices=[('all', 'All'), ('active', 'Active'), ('inactive', 'Inactive')], 
                                     default='all', render_kw={"class": "form-control"})
     
+    report_type = SelectField('Report Type', 
+                             choices=[('totals', 'Totals'), ('trends', 'Trends')], 
+                             default='totals', render_kw={"class": "form-control"})
+    trend_interval = SelectField('Trend Interval', 
+                                choices=list(TREND_INTERVALS.items()), 
+                                default='week', render_kw={"class": "form-control"})
+    trend_group_by = SelectField('Trend Series', 
+                                choices=list(TREND_GROUPS.items()), 
+                                default='worker', render_kw={"class": "form-control"})
+    
     def validate_end_date(self, end_date):
         if self.start_date.data and end_date.data < self.start_date.data:
             raise ValidationError('End date must be after start date.')
@@ -0,0 +1,117 @@
+"""Cached rendering of dashboard template sections.
+
+Wrap a section of a template in a call block naming the fragment and the
+values it depends on besides the household's data:
+
+    {% call cached_fragment('worker_available_tasks', current_status) %}
+        ...
+    {% endcall %}
+
+The rendered HTML is kept under (name, household, household data version,
+*key). Every task and completion write bumps the version (see
+data_version.py), so a write in any process retires the household's cached
+fragments at once; the stale entries are never hit again and age out of the
+LRU. Entries are evicted least recently used first once there are
+FRAGMENT_CACHE_SIZE of them or they hold more than FRAGMENT_CACHE_MAX_BYTES
+of HTML. Per-fragment hits and misses are served on /metrics.
+
+Only values named in the key may change what the block renders; anything
+user-specific must be part of it.
+"""
+import threading
+from collections import defaultdict
+
+from flask import current_app
+from flask_login import current_user
+from markupsafe import Markup
+
+from cache import TTLCache
+import data_version
+import metrics
+
+_stats_lock = threading.Lock()
+_hits = defaultdict(int)
+_misses = defaultdict(int)
+
+
+def _count(counter, name):
+    with _stats_lock:
+        counter[name] += 1
+
+
+def init_app(app):
+    app.extensions['fragment_cache'] = TTLCache(
+        app.config['FRAGMENT_CACHE_TTL'],
+        app.config['FRAGMENT_CACHE_SIZE'],
+        max_bytes=app.config['FRAGMENT_CACHE_MAX_BYTES'],
+        sizeof=lambda html: len(html.encode()),
+    )
+    app.add_template_global(cached_fragment)
+
+
+def _cache():
+    return current_app.extensions['fragment_cache']
+
+
+def cached_fragment(name, *key, caller):
+    """Render the call block once per household data version and key"""
+    admin_id = data_version.household_id(current_user) if current_user.is_authenticated else None
+    if current_app.config['FRAGMENT_CACHE_TTL'] <= 0 or admin_id is None:
+        return caller()
+
+    version, _ = data_version.current(admin_id)
+    cache_key = (name, admin_id, version) + key
+    html = _cache().get(cache_key)
+    if html is not None:
+        _count(_hits, name)
+        return Markup(html)
+
+    _count(_misses, name)
+    html = str(caller())
+    _cache().set(cache_key, html)
+    return Markup(html)
+
+
+def stats():
+    """Hits and misses per fragment, plus the cache's size and evictions"""
+    with _stats_lock:
+        fragments = {
+            name: {'hits': _hits[name], 'misses': _misses[name]}
+            for name in sorted(set(_hits) | set(_misses))
+        }
+    for counts in fragments.values():
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / lookups if lookups else 0.0
+    cache = _cache()
+    return {'fragments': fragments, 'entries': len(cache), 'bytes': cache.size_bytes, 'evictions': cache.evictions}
+
+
+def clear():
+    _cache().clear()
+    with _stats_lock:
+        _hits.clear()
+        _misses.clear()
+
+
+@metrics.register_collector
+def _metrics_lines():
+    current = stats()
+    lines = [
+        '# HELP tasktracker_fragment_cache_lookups_total Cached template fragment lookups, by fragment and result.',
+        '# TYPE tasktracker_fragment_cache_lookups_total counter',
+    ]
+    for name, counts in current['fragments'].items():
+        lines.append(f'tasktracker_fragment_cache_lookups_total{metrics._labels(fragment=name, result="hit")} {counts["hits"]}')
+        lines.append(f'tasktracker_fragment_cache_lookups_total{metrics._labels(fragment=name, result="miss")} {counts["misses"]}')
+    lines += [
+        '# HELP tasktracker_fragment_cache_entries Rendered fragments held in this process.',
+        '# TYPE tasktracker_fragment_cache_entries gauge',
+        f'tasktracker_fragment_cache_entries {current["entries"]}',
+        '# HELP tasktracker_fragment_cache_bytes Size of the rendered fragments held, in bytes.',
+        '# TYPE tasktracker_fragment_cache_bytes gauge',
+        f'tasktracker_fragment_cache_bytes {current["bytes"]}',
+        '# HELP tasktracker_fragment_cache_evictions_total Fragments evicted to stay within the size and memory limits.',
+        '# TYPE tasktracker_fragment_cache_evictions_total counter',
+        f'tasktracker_fragment_cache_evictions_total {current["evictions"]}',
+    ]
+    return lines
@@ -0,0 +1,34 @@
+"""Gunicorn settings, picked up from the working directory by `gunicorn main:app`.
+
+With preload_app (the default here) the master imports the app once and
+forks the workers from it, so they boot in milliseconds and share the
+master's memory pages copy-on-write. Importing the app does not touch the
+database (run `flask --app main db-upgrade` on deploy); any connection the
+master did open is discarded in each worker rather than shared. Set
+GUNICORN_PRELOAD=false to import the app in every worker instead, e.g. for
+--reload during development.
+"""
+import gc
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ["true", "on", "1"]
+reuse_port = True
+
+
+def when_ready(server):
+    # Move everything the preloaded app allocated out of the collector's reach:
+    # collections in the workers would otherwise write to, and so copy, those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    # Pooled connections are per process; never reuse sockets opened in the master
+    from app import db
+    from main import app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,282 @@
+"""Earnings ledger rollup maintenance.
+
+earnings_rollups holds completion counts and task value per (admin, worker,
+day, status). Every write path that changes a completion's status, its task
+value, or deletes completions applies the matching delta here, in the same
+transaction, so dashboards and reports can read small pre-aggregated rows
+instead of scanning task_completions.
+
+Days in closed weeks (see payouts.py) are also tracked in payout_snapshots
+at the value each task had when its week closed: status changes move that
+frozen amount between statuses there, and task value changes leave it alone.
+
+    flask --app main ledger-verify
+    flask --app main ledger-rebuild
+"""
+from decimal import Decimal
+
+import click
+from flask import Blueprint
+from sqlalchemy import func, and_
+
+from app import db
+from models import Task, TaskCompletion, EarningsRollup, PayoutPeriod, PayoutSnapshot
+from db_upsert import insert_for_dialect
+
+bp = Blueprint('ledger', __name__, cli_group=None)
+
+
+def _add_to_row(table, key, count, amount, **extra):
+    """Add count and amount to the row of table with the given key columns, creating it (with extra) if needed"""
+    if not count and not amount:
+        return
+    values = {**key, **extra, 'completion_count': count, 'amount': amount}
+
+    insert = insert_for_dialect()
+    if insert is not None:
+        statement = insert(table).values(**values)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                'completion_count': table.c.completion_count + statement.excluded.completion_count,
+                'amount': table.c.amount + statement.excluded.amount,
+            }
+        )
+        db.session.execute(statement)
+        return
+
+    # Databases without an upsert construct: update, then insert if nothing matched
+    result = db.session.execute(
+        table.update().where(
+            *(table.c[name] == value for name, value in key.items())
+        ).values(
+            completion_count=table.c.completion_count + count,
+            amount=table.c.amount + amount,
+        )
+    )
+    if result.rowcount == 0:
+        db.session.execute(table.insert().values(**values))
+
+
+def apply_delta(admin_id, worker_id, day, status, count, amount):
+    """Add count and amount to one rollup row, creating it if needed"""
+    _add_to_row(EarningsRollup.__table__, {
+        'admin_id': admin_id,
+        'worker_id': worker_id,
+        'day': day,
+        'status': status,
+    }, count, amount)
+
+
+def apply_snapshot_delta(admin_id, worker_id, day, task_id, status, count, amount):
+    """Add count and amount to one payout snapshot row, creating it if needed"""
+    _add_to_row(PayoutSnapshot.__table__, {
+        'worker_id': worker_id,
+        'day': day,
+        'task_id': task_id,
+        'status': status,
+    }, count, amount, admin_id=admin_id)
+
+
+def closed_through(admin_id):
+    """Last day of the household's latest closed week, or None if none has been closed"""
+    return db.session.query(func.max(PayoutPeriod.week_end)).filter(PayoutPeriod.admin_id == admin_id).scalar()
+
+
+def frozen_value(worker_id, day, task_id, default):
+    """The value a completion was priced at when its week closed, or default if it arrived after"""
+    row = db.session.query(PayoutSnapshot.amount, PayoutSnapshot.completion_count).filter(
+        PayoutSnapshot.worker_id == worker_id,
+        PayoutSnapshot.day == day,
+        PayoutSnapshot.task_id == task_id,
+        PayoutSnapshot.completion_count > 0
+    ).first()
+    if row is None:
+        return Decimal(default)
+    return (Decimal(row.amount) / row.completion_count).quantize(Decimal('0.01'))
+
+
+def record_status_change(completion, old_status, new_status):
+    """Move one completion between statuses; None means it did not exist before / no longer exists"""
+    if old_status == new_status:
+        return
+    task = completion.task or db.session.get(Task, completion.task_id)
+    if old_status is not None:
+        apply_delta(task.created_by, completion.worker_id, completion.completion_date, old_status, -1, -task.monetary_value)
+    if new_status is not None:
+        apply_delta(task.created_by, completion.worker_id, completion.completion_date, new_status, 1, task.monetary_value)
+
+    closed = closed_through(task.created_by)
+    if closed is None or completion.completion_date > closed:
+        return
+    value = frozen_value(completion.worker_id, completion.completion_date, task.id, task.monetary_value)
+    if old_status is not None:
+        apply_snapshot_delta(task.created_by, completion.worker_id, completion.completion_date, task.id, old_status, -1, -value)
+    if new_status is not None:
+        apply_snapshot_delta(task.created_by, completion.worker_id, completion.completion_date, task.id, new_status, 1, value)
+
+
+def record_bulk_status_change(criteria, new_status):
+    """Move every completion matching criteria to new_status, in one grouped read
+
+    Call before the set-based UPDATE, while the rows still have their old status.
+    """
+    rows = db.session.query(
+        Task.created_by,
+        TaskCompletion.worker_id,
+        TaskCompletion.completion_date,
+        TaskCompletion.status,
+        func.count(TaskCompletion.id),
+        func.sum(Task.monetary_value)
+    ).join(Task, TaskCompletion.task_id == Task.id).filter(*criteria).group_by(
+        Task.created_by, TaskCompletion.worker_id, TaskCompletion.completion_date, TaskCompletion.status
+    ).all()
+    for admin_id, worker_id, day, old_status, count, amount in rows:
+        if old_status == new_status:
+            continue
+        apply_delta(admin_id, worker_id, day, old_status, -count, -amount)
+        apply_delta(admin_id, worker_id, day, new_status, count, amount)
+
+    closed = {admin_id: closed_through(admin_id) for admin_id in {row[0] for row in rows}}
+    if any(closed.get(row[0]) and row[2] <= closed[row[0]] and row[3] != new_status for row in rows):
+        _record_bulk_snapshot_change(criteria, new_status, closed)
+
+
+def _record_bulk_snapshot_change(criteria, new_status, closed):
+    """The payout snapshot side of record_bulk_status_change, for completions in closed weeks"""
+    # Frozen prices of the matching (worker, day, task) snapshot rows, read in one query
+    frozen = {
+        (row.worker_id, row.day, row.task_id): Decimal(row.amount) / row.completion_count
+        for row in db.session.query(
+            PayoutSnapshot.worker_id, PayoutSnapshot.day, PayoutSnapshot.task_id,
+            PayoutSnapshot.amount, PayoutSnapshot.completion_count
+        ).join(TaskCompletion, and_(
+            TaskCompletion.worker_id == PayoutSnapshot.worker_id,
+            TaskCompletion.completion_date == PayoutSnapshot.day,
+            TaskCompletion.task_id == PayoutSnapshot.task_id
+        )).join(Task, TaskCompletion.task_id == Task.id).filter(
+            *criteria, PayoutSnapshot.completion_count > 0
+        ).distinct()
+    }
+    rows = db.session.query(
+        Task.created_by,
+        TaskCompletion.worker_id,
+        TaskCompletion.completion_date,
+        Task.id,
+        Task.monetary_value,
+        TaskCompletion.status,
+        func.count(TaskCompletion.id)
+    ).join(Task, TaskCompletion.task_id == Task.id).filter(*criteria).group_by(
+        Task.created_by, TaskCompletion.worker_id, TaskCompletion.completion_date, Task.id, Task.monetary_value, TaskCompletion.status
+    ).all()
+    for admin_id, worker_id, day, task_id, current_value, old_status, count in rows:
+        if old_status == new_status or not closed.get(admin_id) or day > closed[admin_id]:
+            continue
+        value = frozen.get((worker_id, day, task_id), Decimal(current_value)).quantize(Decimal('0.01'))
+        apply_snapshot_delta(admin_id, worker_id, day, task_id, old_status, -count, -value * count)
+        apply_snapshot_delta(admin_id, worker_id, day, task_id, new_status, count, value * count)
+
+
+def record_task_value_change(task, old_value):
+    """Re-price every rollup row that includes completions of this task (payout snapshots keep their price)"""
+    difference = Decimal(task.monetary_value) - Decimal(old_value)
+    if not difference:
+        return
+    rows = db.session.query(
+        TaskCompletion.worker_id,
+        TaskCompletion.completion_date,
+        TaskCompletion.status,
+        func.count(TaskCompletion.id)
+    ).filter(TaskCompletion.task_id == task.id).group_by(
+        TaskCompletion.worker_id, TaskCompletion.completion_date, TaskCompletion.status
+    ).all()
+    for worker_id, day, status, count in rows:
+        apply_delta(task.created_by, worker_id, day, status, 0, difference * count)
+
+
+def remove_pending_for_admin(admin_id):
+    """Drop pending rows for an admin's household (weekly reset deletes pending completions)"""
+    EarningsRollup.query.filter_by(admin_id=admin_id, status='pending').delete(synchronize_session=False)
+    PayoutSnapshot.query.filter_by(admin_id=admin_id, status='pending').delete(synchronize_session=False)
+
+
+def remove_worker(worker_id):
+    """Drop every row for a worker (account deletion)"""
+    EarningsRollup.query.filter_by(worker_id=worker_id).delete(synchronize_session=False)
+    PayoutSnapshot.query.filter_by(worker_id=worker_id).delete(synchronize_session=False)
+
+
+def remove_admin(admin_id):
+    """Drop every row for an admin's household (account deletion)"""
+    EarningsRollup.query.filter_by(admin_id=admin_id).delete(synchronize_session=False)
+    PayoutSnapshot.query.filter_by(admin_id=admin_id).delete(synchronize_session=False)
+    PayoutPeriod.query.filter_by(admin_id=admin_id).delete(synchronize_session=False)
+
+
+def _live_rollup_query():
+    """The rollup recomputed from task_completions joined to tasks"""
+    return db.session.query(
+        Task.created_by.label('admin_id'),
+        TaskCompletion.worker_id,
+        TaskCompletion.completion_date.label('day'),
+        TaskCompletion.status,
+        func.count(TaskCompletion.id).label('completion_count'),
+        func.sum(Task.monetary_value).label('amount')
+    ).join(Task, TaskCompletion.task_id == Task.id).group_by(
+        Task.created_by, TaskCompletion.worker_id, TaskCompletion.completion_date, TaskCompletion.status
+    )
+
+
+def _as_key_map(rows):
+    return {
+        (row.admin_id, row.worker_id, row.day, row.status): (int(row.completion_count), Decimal(str(row.amount or 0)).quantize(Decimal('0.01')))
+        for row in rows
+        if row.completion_count
+    }
+
+
+def rebuild():
+    """Recompute the whole rollup from task_completions, returning the number of rows written"""
+    EarningsRollup.query.delete(synchronize_session=False)
+    live = _live_rollup_query().subquery()
+    db.session.execute(
+        EarningsRollup.__table__.insert().from_select(
+            ['admin_id', 'worker_id', 'day', 'status', 'completion_count', 'amount'],
+            db.select(live.c.admin_id, live.c.worker_id, live.c.day, live.c.status, live.c.completion_count, live.c.amount)
+        )
+    )
+    db.session.commit()
+    return EarningsRollup.query.count()
+
+
+def verify():
+    """Diff the stored rollup against a fresh recomputation
+
+    Returns a list of (key, stored, expected) tuples, where stored and
+    expected are (count, amount) pairs or None. An empty list means the
+    rollup is consistent.
+    """
+    expected = _as_key_map(_live_rollup_query().all())
+    stored = _as_key_map(EarningsRollup.query.all())
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(set(expected) | set(stored), key=str)
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+@bp.cli.command('ledger-rebuild')
+def ledger_rebuild_command():
+    """Recompute the earnings rollup from scratch."""
+    click.echo(f'Rebuilt earnings rollup: {rebuild()} rows.')
+
+
+@bp.cli.command('ledger-verify')
+def ledger_verify_command():
+    """Compare the earnings rollup with task_completions and report differences."""
+    differences = verify()
+    for key, stored, expected in differences:
+        click.echo(f'{key}: stored={stored} expected={expected}')
+    if differences:
+        raise SystemExit(f'{len(differences)} rollup rows differ; run ledger-rebuild.')
+    click.echo('Earnings rollup matches task_completions.')
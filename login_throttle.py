@@ -0,0 +1,110 @@
+"""Failed login throttling.
+
+Failed logins are counted per client IP and per account in fixed windows of
+LOGIN_THROTTLE_WINDOW seconds. The counters live in the login_throttles table,
+so every gunicorn worker sees the same state. /login checks them before it
+looks the user up or runs the password hash, so a credential-stuffing burst
+is turned away with a cheap primary-key read instead of burning CPU on
+hashing.
+
+    flask --app main login-throttle-prune   # drop expired counters
+"""
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import case
+
+from app import db
+from models import LoginThrottle
+from db_upsert import insert_for_dialect
+
+bp = Blueprint('login_throttle', __name__, cli_group=None)
+
+
+def _keys(ip_address, email):
+    keys = {}
+    if ip_address:
+        keys[f'ip:{ip_address}'] = current_app.config['LOGIN_MAX_FAILURES_PER_IP']
+    if email:
+        keys[f'account:{email.strip().lower()}'] = current_app.config['LOGIN_MAX_FAILURES_PER_ACCOUNT']
+    return keys
+
+
+def _as_utc(value):
+    # Naive datetimes from the database are UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _window_cutoff(now):
+    return now - timedelta(seconds=current_app.config['LOGIN_THROTTLE_WINDOW'])
+
+
+def retry_after(ip_address, email):
+    """Seconds until this IP and account may try again, or 0 if they are not throttled"""
+    keys = _keys(ip_address, email)
+    now = datetime.now(timezone.utc)
+    rows = LoginThrottle.query.filter(
+        LoginThrottle.key.in_(keys),
+        LoginThrottle.window_start >= _window_cutoff(now)
+    ).all()
+
+    wait = 0
+    for row in rows:
+        if row.failures < keys[row.key]:
+            continue
+        window_end = _as_utc(row.window_start) + timedelta(seconds=current_app.config['LOGIN_THROTTLE_WINDOW'])
+        wait = max(wait, int((window_end - now).total_seconds()) + 1)
+    return wait
+
+
+def record_failure(ip_address, email):
+    """Count a failed login against the IP and the account; the caller commits"""
+    now = datetime.now(timezone.utc)
+    cutoff = _window_cutoff(now)
+    table = LoginThrottle.__table__
+    insert = insert_for_dialect()
+
+    for key in _keys(ip_address, email):
+        if insert is not None:
+            # Start a new window if the stored one has expired, otherwise add to it
+            expired = table.c.window_start < cutoff
+            statement = insert(table).values(key=key, failures=1, window_start=now)
+            statement = statement.on_conflict_do_update(
+                index_elements=['key'],
+                set_={
+                    'failures': case((expired, 1), else_=table.c.failures + 1),
+                    'window_start': case((expired, now), else_=table.c.window_start),
+                }
+            )
+            db.session.execute(statement)
+            continue
+
+        row = db.session.get(LoginThrottle, key, with_for_update=True)
+        if row is None:
+            db.session.add(LoginThrottle(key=key, failures=1, window_start=now))
+        elif _as_utc(row.window_start) < cutoff:
+            row.failures = 1
+            row.window_start = now
+        else:
+            row.failures += 1
+
+
+def clear_account(email):
+    """Forget an account's failures after a successful login; the caller commits"""
+    LoginThrottle.query.filter_by(key=f'account:{email.strip().lower()}').delete(synchronize_session=False)
+
+
+def prune():
+    """Delete counters whose window has expired, returning how many were removed"""
+    removed = LoginThrottle.query.filter(
+        LoginThrottle.window_start < _window_cutoff(datetime.now(timezone.utc))
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+@bp.cli.command('login-throttle-prune')
+def login_throttle_prune_command():
+    """Delete expired failed-login counters."""
+    click.echo(f'Removed {prune()} expired login throttle rows.')
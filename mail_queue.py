@@ -0,0 +1,250 @@
+"""Outbound email queue.
+
+Requests never talk to the mail server: enqueue() stores the message in
+outbound_emails as part of the caller's transaction, and a worker delivers
+due messages in batches over a single SMTP connection. Failed sends are
+retried with exponential backoff; after MAIL_QUEUE_MAX_ATTEMPTS, or on a
+permanent (5xx) rejection, a message is marked dead and kept for inspection.
+
+Each batch is claimed first: marked sending, with a MAIL_QUEUE_LEASE_SECONDS
+lease, and committed. The SMTP conversation happens outside any transaction
+and the outcomes are recorded in a second one, so several workers can drain
+the queue side by side without holding row locks on a slow mail server. A
+message whose worker died mid-batch is picked up again when its lease expires.
+
+    flask --app main mail-worker          # poll and deliver until stopped
+    flask --app main mail-worker --once   # deliver what is due, then exit
+    flask --app main mail-status
+    flask --app main mail-requeue         # retry dead messages
+
+Set MAIL_QUEUE_WORKER_THREAD=true to drain the queue from a daemon thread in
+each web process instead of running a separate worker. The thread starts with
+the process's first request, so gunicorn workers forked from a preloaded
+master each get their own.
+"""
+import json
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import Blueprint, current_app
+from flask_mail import Message
+from sqlalchemy import func
+
+from app import db
+from models import OutboundEmail
+from email_utils import mail
+
+bp = Blueprint('mail_queue', __name__, cli_group=None)
+
+# Longest wait between retries of one message
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+
+def enqueue(message):
+    """Queue a flask_mail Message for delivery; committed with the caller's transaction"""
+    email = OutboundEmail(
+        sender=message.sender if isinstance(message.sender, str) else None,
+        recipients=json.dumps(list(message.recipients)),
+        subject=message.subject,
+        body=message.body,
+        html=message.html,
+    )
+    db.session.add(email)
+    return email
+
+
+def _as_message(email):
+    return Message(
+        subject=email.subject,
+        recipients=json.loads(email.recipients),
+        sender=email.sender or current_app.config.get('MAIL_DEFAULT_SENDER'),
+        body=email.body,
+        html=email.html,
+    )
+
+
+def _is_permanent(error):
+    """5xx replies and refused recipients will not succeed on retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if _is_permanent(error) or email.attempts >= current_app.config['MAIL_QUEUE_MAX_ATTEMPTS']:
+        email.status = 'dead'
+        current_app.logger.error(f'Email {email.id} to {email.recipients} dead after {email.attempts} attempts: {email.last_error}')
+        return
+    delay = timedelta(seconds=current_app.config['MAIL_QUEUE_RETRY_SECONDS'] * 2 ** (email.attempts - 1))
+    delay = min(delay, MAX_RETRY_DELAY) * random.uniform(1, 1.1)
+    email.status = 'queued'
+    email.next_attempt_at = now + delay
+    current_app.logger.warning(f'Email {email.id} failed (attempt {email.attempts}), retrying in {delay}: {email.last_error}')
+
+
+def _claim(batch_size, now):
+    """Mark up to batch_size due messages as sending and commit, returning [(id, Message)]
+
+    While a message is sending, next_attempt_at is its lease: if the worker
+    dies before recording the outcome, the message is due again once the
+    lease runs out.
+    """
+    due = OutboundEmail.query.filter(
+        OutboundEmail.status.in_(('queued', 'sending')),
+        OutboundEmail.next_attempt_at <= now
+    ).order_by(OutboundEmail.next_attempt_at, OutboundEmail.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    lease_until = now + timedelta(seconds=current_app.config['MAIL_QUEUE_LEASE_SECONDS'])
+    claimed = []
+    for email in due:
+        email.status = 'sending'
+        email.next_attempt_at = lease_until
+        claimed.append((email.id, _as_message(email)))
+    db.session.commit()
+    return claimed
+
+
+def _send(claimed):
+    """Send claimed messages over one SMTP connection, returning {id: None or the exception}
+
+    Messages left out of the result were not tried.
+    """
+    outcomes = {}
+    untried = list(claimed)
+    try:
+        with mail.connect() as connection:
+            while untried:
+                email_id, message = untried.pop(0)
+                try:
+                    connection.send(message)
+                except smtplib.SMTPServerDisconnected as e:
+                    outcomes[email_id] = e
+                    # The connection is gone; leave the rest of the batch for the next pass
+                    untried = []
+                except Exception as e:
+                    outcomes[email_id] = e
+                else:
+                    outcomes[email_id] = None
+    except Exception as e:
+        # Could not connect or log in: each message not yet tried counts a failed attempt
+        for email_id, message in untried:
+            outcomes[email_id] = e
+    return outcomes
+
+
+def _record(claimed, outcomes):
+    """Store the outcome of each claimed message and release the rest, returning (sent, failed)"""
+    now = datetime.now(timezone.utc)
+    sent = failed = 0
+    emails = OutboundEmail.query.filter(
+        OutboundEmail.id.in_([email_id for email_id, message in claimed]),
+        OutboundEmail.status == 'sending'
+    ).with_for_update().all()
+    for email in emails:
+        if email.id not in outcomes:
+            email.status = 'queued'
+            email.next_attempt_at = now
+        elif outcomes[email.id] is None:
+            email.status = 'sent'
+            email.sent_at = now
+            email.attempts += 1
+            email.last_error = None
+            sent += 1
+        else:
+            _record_failure(email, outcomes[email.id], now)
+            failed += 1
+    db.session.commit()
+    return sent, failed
+
+
+def deliver_due(batch_size=None):
+    """Send up to batch_size due messages over one SMTP connection, returning (sent, failed)
+
+    Claiming the batch and recording the outcomes are two short transactions;
+    no transaction or row lock is held while talking to the mail server.
+    """
+    batch_size = batch_size or current_app.config['MAIL_QUEUE_BATCH_SIZE']
+    claimed = _claim(batch_size, datetime.now(timezone.utc))
+    if not claimed:
+        return 0, 0
+    return _record(claimed, _send(claimed))
+
+
+def run_worker(poll_seconds=None, once=False):
+    """Deliver due messages until stopped; with once, return after the queue has nothing due"""
+    poll_seconds = poll_seconds or current_app.config['MAIL_QUEUE_POLL_SECONDS']
+    while True:
+        try:
+            sent, failed = deliver_due()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Mail queue pass failed: {e}')
+            sent = failed = 0
+        finally:
+            db.session.remove()
+        if sent or failed:
+            current_app.logger.info(f'Mail queue: {sent} sent, {failed} failed')
+        if once and not sent and not failed:
+            return
+        if not sent:
+            time.sleep(poll_seconds)
+
+
+def start_worker_thread():
+    """Drain the queue from a daemon thread in this process"""
+    app = current_app._get_current_object()
+
+    def worker():
+        with app.app_context():
+            run_worker()
+    thread = threading.Thread(target=worker, name='mail-queue', daemon=True)
+    thread.start()
+    return thread
+
+
+_thread_lock = threading.Lock()
+_thread_pid = None
+
+
+@bp.before_app_request
+def _ensure_worker_thread():
+    # Threads do not survive fork, so track the process that started ours
+    global _thread_pid
+    if not current_app.config['MAIL_QUEUE_WORKER_THREAD'] or _thread_pid == os.getpid():
+        return
+    with _thread_lock:
+        if _thread_pid != os.getpid():
+            start_worker_thread()
+            _thread_pid = os.getpid()
+
+
+@bp.cli.command('mail-worker')
+@click.option('--once', is_flag=True, help='Deliver everything due, then exit.')
+def mail_worker_command(once):
+    """Deliver queued emails."""
+    run_worker(once=once)
+
+
+@bp.cli.command('mail-status')
+def mail_status_command():
+    """Count queued, sending, sent and dead emails."""
+    counts = dict(db.session.query(OutboundEmail.status, func.count(OutboundEmail.id)).group_by(OutboundEmail.status).all())
+    for status in ('queued', 'sending', 'sent', 'dead'):
+        click.echo(f'{status:<8} {counts.get(status, 0)}')
+
+
+@bp.cli.command('mail-requeue')
+def mail_requeue_command():
+    """Move dead emails back onto the queue."""
+    requeued = OutboundEmail.query.filter_by(status='dead').update(
+        {'status': 'queued', 'attempts': 0, 'next_attempt_at': datetime.now(timezone.utc)},
+        synchronize_session=False
+    )
+    db.session.commit()
+    click.echo(f'Requeued {requeued} emails.')
@@ -1,5 +1,10 @@
-from app import app
-import routes  # noqa: F401
+from app import create_app
+
+app = create_app()
 
 if __name__ == "__main__":
+    # Development server: bring the schema up to date first (production runs db-upgrade on deploy)
+    from migrations import upgrade
+    with app.app_context():
+        upgrade()
     app.run(host="0.0.0.0", port=5000, debug=True)
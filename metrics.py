@@ -0,0 +1,177 @@
+"""Per-request latency and SQL instrumentation.
+
+Every request records its latency, the number of SQL statements it ran and
+the time spent in them, labelled by Flask endpoint. The totals are served in
+Prometheus text format at /metrics, which answers only when METRICS_TOKEN is
+set and the scraper sends it as a bearer token:
+
+    curl -H "Authorization: Bearer $METRICS_TOKEN" http://localhost:5000/metrics
+
+With SERVER_TIMING enabled each response also carries a Server-Timing header
+(app and db durations, query count) for the browser dev tools.
+
+Metrics are kept per process; under gunicorn each worker reports its own.
+"""
+import hmac
+import threading
+import time
+from collections import defaultdict
+
+from flask import Blueprint, current_app, g, has_request_context, request, abort, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import db_pool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class _Registry:
+    """Thread-safe store of the per-endpoint series"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: _Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: _Histogram(QUERY_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(float)
+
+    def record(self, endpoint, method, status, seconds, query_count, db_seconds):
+        with self._lock:
+            self.requests[(endpoint, method, str(status))] += 1
+            self.latency[(endpoint, method)].observe(seconds)
+            self.queries[(endpoint, method)].observe(query_count)
+            self.db_seconds[(endpoint, method)] += db_seconds
+
+    def render(self):
+        """The current series in Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                '# HELP tasktracker_requests_total Requests handled, by endpoint, method and status.',
+                '# TYPE tasktracker_requests_total counter',
+            ]
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'tasktracker_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}')
+
+            lines += _render_histogram(
+                'tasktracker_request_duration_seconds', 'Request latency in seconds.', self.latency
+            )
+            lines += _render_histogram(
+                'tasktracker_request_queries', 'SQL statements executed per request.', self.queries
+            )
+
+            lines += [
+                '# HELP tasktracker_request_db_seconds_total Time spent executing SQL, in seconds.',
+                '# TYPE tasktracker_request_db_seconds_total counter',
+            ]
+            for (endpoint, method), seconds in sorted(self.db_seconds.items()):
+                lines.append(f'tasktracker_request_db_seconds_total{_labels(endpoint=endpoint, method=method)} {seconds:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _render_histogram(name, help_text, series):
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for (endpoint, method), histogram in sorted(series.items()):
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le=bound)} {count}')
+        lines.append(f'{name}_bucket{_labels(endpoint=endpoint, method=method, le="+Inf")} {histogram.total}')
+        lines.append(f'{name}_sum{_labels(endpoint=endpoint, method=method)} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{_labels(endpoint=endpoint, method=method)} {histogram.total}')
+    return lines
+
+
+registry = _Registry()
+
+bp = Blueprint('metrics', __name__)
+
+# Callables returning extra exposition lines, e.g. cache statistics (see fragment_cache.py)
+_collectors = []
+
+
+def register_collector(collector):
+    """Append the lines collector() returns to every /metrics response"""
+    _collectors.append(collector)
+    return collector
+
+
+register_collector(db_pool.metrics_lines)
+
+
+# SQL timing: every engine, counted against the current request if there is one
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and conn.info.get('query_start'):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        g.query_count = g.get('query_count', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.0) + elapsed
+
+
+@bp.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.query_count = 0
+    g.db_seconds = 0.0
+
+
+@bp.after_app_request
+def _record_request(response):
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    query_count = g.get('query_count', 0)
+    db_seconds = g.get('db_seconds', 0.0)
+
+    registry.record(request.endpoint or 'unmatched', request.method, response.status_code, elapsed, query_count, db_seconds)
+
+    if current_app.config['SERVER_TIMING']:
+        response.headers.add(
+            'Server-Timing',
+            f'app;dur={elapsed * 1000:.1f}, db;dur={db_seconds * 1000:.1f};desc="{query_count} queries"'
+        )
+    return response
+
+
+@bp.route('/metrics')
+def metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        abort(403)
+    body = registry.render() + ''.join('\n'.join(collector()) + '\n' for collector in _collectors)
+    return Response(body, mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,143 @@
+"""Versioned schema migrations.
+
+db.create_all() only creates missing tables and never alters existing ones,
+so schema changes for databases that already exist live here. Each migration
+runs once and is recorded in the schema_migrations table:
+
+    flask --app main db-upgrade
+    flask --app main db-status
+"""
+import click
+from flask import Blueprint
+from app import db
+from models import User, Task, TaskCompletion, SchemaMigration, EarningsRollup, OutboundEmail, NotificationEvent, LoginThrottle, HouseholdVersion, PayoutPeriod, PayoutSnapshot
+import ledger
+
+bp = Blueprint('migrations', __name__, cli_group=None)
+
+
+def _index(model, name):
+    """Look up a named index declared in a model's __table_args__"""
+    for index in model.__table__.indexes:
+        if index.name == name:
+            return index
+    raise KeyError(f'{model.__tablename__} has no index named {name}')
+
+
+HOT_PATH_INDEXES = [
+    (User, 'ix_users_admin_role_active'),
+    (Task, 'ix_tasks_created_by_active'),
+    (TaskCompletion, 'ix_task_completions_worker_status_date'),
+    (TaskCompletion, 'ix_task_completions_task_status'),
+]
+
+
+def create_indexes(indexes):
+    """Create the given (model, index name) pairs, skipping any that already exist"""
+    for model, name in indexes:
+        _index(model, name).create(db.engine, checkfirst=True)
+
+
+def drop_indexes(indexes):
+    """Drop the given (model, index name) pairs, skipping any that do not exist"""
+    for model, name in indexes:
+        _index(model, name).drop(db.engine, checkfirst=True)
+
+
+KEYSET_INDEXES = [
+    (TaskCompletion, 'ix_task_completions_worker_submitted'),
+]
+
+
+def _initial_schema():
+    db.create_all()
+
+
+def _hot_path_indexes():
+    create_indexes(HOT_PATH_INDEXES)
+
+
+def _keyset_indexes():
+    create_indexes(KEYSET_INDEXES)
+
+
+def _earnings_rollup():
+    EarningsRollup.__table__.create(db.engine, checkfirst=True)
+    ledger.rebuild()
+
+
+def _outbound_emails():
+    OutboundEmail.__table__.create(db.engine, checkfirst=True)
+
+
+def _notification_events():
+    NotificationEvent.__table__.create(db.engine, checkfirst=True)
+
+
+def _login_throttles():
+    LoginThrottle.__table__.create(db.engine, checkfirst=True)
+
+
+def _household_versions():
+    HouseholdVersion.__table__.create(db.engine, checkfirst=True)
+
+
+def _payout_snapshots():
+    # Weeks are closed by the next weekly reset, or `flask payouts-close`
+    PayoutPeriod.__table__.create(db.engine, checkfirst=True)
+    PayoutSnapshot.__table__.create(db.engine, checkfirst=True)
+
+
+# (version, name, upgrade function) - append only, never renumber
+MIGRATIONS = [
+    (1, 'Initial schema', _initial_schema),
+    (2, 'Composite indexes for hot query shapes', _hot_path_indexes),
+    (3, 'Keyset pagination index for completion history', _keyset_indexes),
+    (4, 'Earnings ledger rollup table, backfilled', _earnings_rollup),
+    (5, 'Outbound email queue', _outbound_emails),
+    (6, 'Notification events for digest emails', _notification_events),
+    (7, 'Login attempt throttling', _login_throttles),
+    (8, 'Per-household data versions for conditional GET', _household_versions),
+    (9, 'Frozen weekly payout snapshots', _payout_snapshots),
+]
+
+
+def get_applied_versions():
+    """Return the set of migration versions already recorded in the database"""
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    return {version for (version,) in db.session.query(SchemaMigration.version).all()}
+
+
+def upgrade():
+    """Apply all pending migrations in order, returning the ones applied"""
+    applied = get_applied_versions()
+    newly_applied = []
+    
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate()
+        db.session.add(SchemaMigration(version=version, name=name))
+        db.session.commit()
+        newly_applied.append((version, name))
+    
+    return newly_applied
+
+
+@bp.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    newly_applied = upgrade()
+    if not newly_applied:
+        click.echo('Database schema is up to date.')
+    for version, name in newly_applied:
+        click.echo(f'Applied migration {version}: {name}')
+
+
+@bp.cli.command('db-status')
+def db_status_command():
+    """List schema migrations and whether each has been applied."""
+    applied = get_applied_versions()
+    for version, name, _ in MIGRATIONS:
+        state = 'applied' if version in applied else 'pending'
+        click.echo(f'{version:>4}  {state:<8} {name}')
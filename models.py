@@ -1,12 +1,23 @@
 from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 from app import db
 
+@lru_cache(maxsize=None)
+def _password_hash_prefix(method):
+    """The method prefix Werkzeug writes for a hash method, with its defaults filled in"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Active workers under an admin (dashboards, reports)
+        db.Index('ix_users_admin_role_active', 'admin_id', 'role', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
@@ -28,11 +39,15 @@ class User(UserMixin, db.Model):
     reviewed_completions = db.relationship('TaskCompletion', foreign_keys='TaskCompletion.reviewed_by', backref='reviewer')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """True if the stored hash was made with different parameters than PASSWORD_HASH_METHOD"""
+        return self.password_hash.split('$', 1)[0] != _password_hash_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+    
     def is_admin(self):
         return self.role == 'admin'
     
@@ -75,6 +90,10 @@ class User(UserMixin, db.Model):
 
 class Task(db.Model):
     __tablename__ = 'tasks'
+    __table_args__ = (
+        # Task lists and active task counts for an admin
+        db.Index('ix_tasks_created_by_active', 'created_by', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -95,6 +114,14 @@ class Task(db.Model):
 
 class TaskCompletion(db.Model):
     __tablename__ = 'task_completions'
+    __table_args__ = (
+        # Worker stats, activity reports and payment summaries
+        db.Index('ix_task_completions_worker_status_date', 'worker_id', 'status', 'completion_date'),
+        # Admin-side joins from tasks.created_by filtered by status (approvals, awaiting payment)
+        db.Index('ix_task_completions_task_status', 'task_id', 'status'),
+        # Keyset pagination of a worker's history by (submitted_at, id)
+        db.Index('ix_task_completions_worker_submitted', 'worker_id', 'submitted_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False)
@@ -108,6 +135,14 @@ class TaskCompletion(db.Model):
     
     # Relationships are defined in User model
     
+    # Frozen payout price for completions in closed weeks, set by utils.attach_payout_values
+    payout_value = None
+    
+    @property
+    def value(self):
+        """What the completion is worth: its frozen payout price if attached, else its task's current value"""
+        return self.task.monetary_value if self.payout_value is None else self.payout_value
+    
     def __repr__(self):
         return f'<TaskCompletion {self.task_id} by {self.worker_id}>'
 
@@ -124,3 +159,140 @@ class WeeklyReset(db.Model):
     
     def __repr__(self):
         return f'<WeeklyReset {self.reset_date} by Admin {self.admin_id}>'
+
+class EarningsRollup(db.Model):
+    """Completion counts and task value per (admin, worker, day, status), maintained by ledger.py"""
+    __tablename__ = 'earnings_rollups'
+    
+    admin_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    worker_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    completion_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_earnings_rollups_worker_status_day', 'worker_id', 'status', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<EarningsRollup {self.admin_id}/{self.worker_id} {self.day} {self.status}>'
+
+class PayoutPeriod(db.Model):
+    """A closed week for one household; its earnings are frozen in payout_snapshots (see payouts.py)"""
+    __tablename__ = 'payout_periods'
+    
+    admin_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    week_start = db.Column(db.Date, primary_key=True)
+    week_end = db.Column(db.Date, nullable=False)
+    closed_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # The weekly reset that closed the week; NULL when closed by `flask payouts-close`
+    weekly_reset_id = db.Column(db.Integer, db.ForeignKey('weekly_resets.id'), nullable=True)
+    
+    weekly_reset = db.relationship('WeeklyReset')
+    
+    def __repr__(self):
+        return f'<PayoutPeriod {self.admin_id} {self.week_start}>'
+
+class PayoutSnapshot(db.Model):
+    """Completion counts and task value per (worker, day, task, status) in closed weeks, priced at close
+
+    Written by payouts.close_weeks(); ledger.py moves the frozen amounts
+    between statuses as completions are paid or reviewed later, but never
+    re-prices them when a task's value changes.
+    """
+    __tablename__ = 'payout_snapshots'
+    
+    worker_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    day = db.Column(db.Date, primary_key=True)
+    task_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(20), primary_key=True)
+    admin_id = db.Column(db.Integer, nullable=False)
+    completion_count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_payout_snapshots_admin_day', 'admin_id', 'day'),
+    )
+    
+    def __repr__(self):
+        return f'<PayoutSnapshot {self.worker_id} {self.day} task {self.task_id} {self.status}>'
+
+class OutboundEmail(db.Model):
+    """An email waiting for, or done with, delivery by mail_queue.py"""
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        # The delivery worker's poll for due messages
+        db.Index('ix_outbound_emails_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sender = db.Column(db.String(200), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list of addresses
+    subject = db.Column(db.String(500), nullable=False)
+    body = db.Column(db.Text, nullable=True)
+    html = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'sending', 'sent', 'dead'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    # While sending: when the claim lapses (see mail_queue._claim)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<OutboundEmail {self.id} {self.status}>'
+
+class NotificationEvent(db.Model):
+    """A completion status change waiting to go out in a worker's digest email (see digests.py)"""
+    __tablename__ = 'notification_events'
+    __table_args__ = (
+        # Undigested events grouped by worker
+        db.Index('ix_notification_events_digested_worker', 'digested_at', 'worker_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, nullable=False)
+    # No foreign keys: weekly resets and account deletion remove the rows these describe
+    completion_id = db.Column(db.Integer, nullable=True)
+    event = db.Column(db.String(20), nullable=False)  # 'approved', 'rejected', 'paid', 'reset'
+    task_title = db.Column(db.String(200), nullable=False)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    completion_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    digested_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<NotificationEvent {self.event} {self.completion_id} for {self.worker_id}>'
+
+class LoginThrottle(db.Model):
+    """Failed login count for one client IP or account in the current window (see login_throttle.py)"""
+    __tablename__ = 'login_throttles'
+    
+    key = db.Column(db.String(255), primary_key=True)  # 'ip:<address>' or 'account:<email>'
+    failures = db.Column(db.Integer, nullable=False, default=0)
+    window_start = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<LoginThrottle {self.key} {self.failures}>'
+
+class HouseholdVersion(db.Model):
+    """Counter bumped by every write to an admin's tasks, workers or completions (see data_version.py)"""
+    __tablename__ = 'household_versions'
+    
+    admin_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<HouseholdVersion {self.admin_id} v{self.version}>'
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version} {self.name}>'
@@ -0,0 +1,168 @@
+"""Weekly payout snapshots: closed weeks frozen at the task values they closed with.
+
+The weekly reset closes every week (Monday to Sunday, as get_week_dates)
+that ended before the current one, after removing pending completions. Each
+completion in those weeks is copied into payout_snapshots, priced at its
+task's value at that moment, and a payout_periods row records the week as
+closed. Reports read closed weeks from the snapshots and compute only the
+days after a household's latest closed week live, so editing a task's value
+no longer rewrites the totals of past weeks.
+
+Paying, reviewing or resubmitting a completion in a closed week later moves
+its frozen amount between statuses (see ledger.py); the amount itself does
+not change.
+
+    flask --app main payouts-close     # close finished weeks for every household, without a reset
+    flask --app main payouts-verify    # compare snapshots with task_completions and the rollup
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import click
+from flask import Blueprint
+from sqlalchemy import func
+
+from app import db
+from models import User, Task, TaskCompletion, EarningsRollup, PayoutPeriod, PayoutSnapshot
+from utils import get_week_dates
+import ledger
+
+bp = Blueprint('payouts', __name__, cli_group=None)
+
+
+def close_weeks(admin_id, today=None, weekly_reset=None):
+    """Snapshot and close every unclosed week of a household that ended before today's week
+
+    Weeks close in order, so the household's closed weeks always run up to
+    ledger.closed_through(). The caller commits. Returns the number of weeks
+    closed.
+    """
+    week_start, _ = get_week_dates(today or date.today())
+    close_end = week_start - timedelta(days=1)
+    previous = ledger.closed_through(admin_id)
+    if previous is not None and previous >= close_end:
+        return 0
+
+    if previous is None:
+        first_day = db.session.query(func.min(TaskCompletion.completion_date)).join(
+            Task, TaskCompletion.task_id == Task.id
+        ).filter(Task.created_by == admin_id).scalar()
+        first_week, _ = get_week_dates(min(first_day, close_end) if first_day else close_end)
+    else:
+        first_week = previous + timedelta(days=1)
+
+    snapshot = db.session.query(
+        TaskCompletion.worker_id,
+        TaskCompletion.completion_date,
+        Task.id,
+        TaskCompletion.status,
+        Task.created_by,
+        func.count(TaskCompletion.id),
+        func.sum(Task.monetary_value)
+    ).join(Task, TaskCompletion.task_id == Task.id).filter(
+        Task.created_by == admin_id,
+        TaskCompletion.completion_date >= first_week,
+        TaskCompletion.completion_date <= close_end
+    ).group_by(
+        TaskCompletion.worker_id, TaskCompletion.completion_date, Task.id, TaskCompletion.status, Task.created_by
+    )
+    db.session.execute(
+        PayoutSnapshot.__table__.insert().from_select(
+            ['worker_id', 'day', 'task_id', 'status', 'admin_id', 'completion_count', 'amount'],
+            snapshot.statement
+        )
+    )
+
+    weeks = 0
+    week = first_week
+    while week <= close_end:
+        db.session.add(PayoutPeriod(admin_id=admin_id, week_start=week, week_end=week + timedelta(days=6), weekly_reset=weekly_reset))
+        week += timedelta(days=7)
+        weeks += 1
+    return weeks
+
+
+def close_all_admins(today=None):
+    """Close finished weeks for every active household, one transaction each; returns weeks closed"""
+    admin_ids = [
+        admin_id for (admin_id,) in db.session.query(User.id).filter_by(role='admin', is_active=True).order_by(User.id).all()
+    ]
+    closed = 0
+    for admin_id in admin_ids:
+        closed += close_weeks(admin_id, today)
+        db.session.commit()
+    return closed
+
+
+def verify():
+    """Diff payout snapshots against task_completions and the earnings rollup for every closed day
+
+    Returns a list of (key, stored, expected) tuples; an empty list means
+    the snapshots are consistent. Snapshot completion counts are compared
+    with task_completions, keyed by (worker, day, task, status); their
+    amounts are frozen on purpose, so they are not. The rollup follows
+    current task values (it is what PAYOUT_SNAPSHOT_READS=false reads), so
+    its closed-day rows, keyed by ('rollup', admin, worker, day, status),
+    must hold the snapshot counts priced at those values: (count, amount)
+    pairs are compared.
+    """
+    closed = dict(
+        db.session.query(PayoutPeriod.admin_id, func.max(PayoutPeriod.week_end)).group_by(PayoutPeriod.admin_id).all()
+    )
+
+    def is_closed(admin_id, day):
+        return admin_id in closed and day <= closed[admin_id]
+
+    expected = {}
+    for admin_id, worker_id, day, task_id, status, count in db.session.query(
+        Task.created_by, TaskCompletion.worker_id, TaskCompletion.completion_date, Task.id, TaskCompletion.status,
+        func.count(TaskCompletion.id)
+    ).join(Task, TaskCompletion.task_id == Task.id).group_by(
+        Task.created_by, TaskCompletion.worker_id, TaskCompletion.completion_date, Task.id, TaskCompletion.status
+    ):
+        if is_closed(admin_id, day):
+            expected[(worker_id, day, task_id, status)] = count
+    stored = {
+        (row.worker_id, row.day, row.task_id, row.status): row.completion_count
+        for row in PayoutSnapshot.query.filter(PayoutSnapshot.completion_count != 0)
+    }
+
+    for admin_id, worker_id, day, status, count, amount in db.session.query(
+        PayoutSnapshot.admin_id, PayoutSnapshot.worker_id, PayoutSnapshot.day, PayoutSnapshot.status,
+        func.sum(PayoutSnapshot.completion_count),
+        func.sum(PayoutSnapshot.completion_count * Task.monetary_value)
+    ).join(Task, PayoutSnapshot.task_id == Task.id).group_by(
+        PayoutSnapshot.admin_id, PayoutSnapshot.worker_id, PayoutSnapshot.day, PayoutSnapshot.status
+    ):
+        if count:
+            expected[('rollup', admin_id, worker_id, day, status)] = (int(count), _money(amount))
+    for row in EarningsRollup.query.filter(EarningsRollup.completion_count != 0):
+        if is_closed(row.admin_id, row.day):
+            stored[('rollup', row.admin_id, row.worker_id, row.day, row.status)] = (row.completion_count, _money(row.amount))
+
+    return [
+        (key, stored.get(key), expected.get(key))
+        for key in sorted(set(expected) | set(stored), key=str)
+        if stored.get(key) != expected.get(key)
+    ]
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+@bp.cli.command('payouts-close')
+def payouts_close_command():
+    """Snapshot every finished week that is not closed yet, for every household."""
+    click.echo(f'Closed {close_all_admins()} household weeks.')
+
+
+@bp.cli.command('payouts-verify')
+def payouts_verify_command():
+    """Compare payout snapshots with task_completions and the earnings rollup and report differences."""
+    differences = verify()
+    for key, stored, expected in differences:
+        click.echo(f'{key}: stored={stored} expected={expected}')
+    if differences:
+        raise SystemExit(f'{len(differences)} snapshot rows differ.')
+    click.echo('Payout snapshots match task_completions and the earnings rollup.')
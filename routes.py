@@ -1,57 +1,82 @@
-from flask import render_template, redirect, url_for, flash, request, abort, make_response, session
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, make_response, session, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from datetime import datetime, date, timezone, timedelta
 from decimal import Decimal
 import csv
-from io import StringIO
+from werkzeug.exceptions import ServiceUnavailable
 
-from app import app, db, login_manager
+from app import db, login_manager
 from models import User, Task, TaskCompletion
-from sqlalchemy import func
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import joinedload
 from forms import LoginForm, RegisterForm, TaskForm, TaskCompletionForm, ApprovalForm, ReportForm, ChangePasswordForm, DeleteAccountForm, ForgotPasswordForm, ResetPasswordForm
+import ledger
+import digests
+import login_throttle
+import user_cache
+import data_version
+from data_version import conditional
+from task_facets import get_task_facets
 from auth import admin_required, worker_required, owns_worker, owns_task, can_complete_task
-from utils import calculate_worker_payment, calculate_admin_payments, get_pending_approvals, get_worker_stats, reset_weekly_tasks, get_week_dates, get_worker_payment_summary, get_all_worker_activity, get_all_admin_activity
+from utils import calculate_worker_payment, get_worker_stats, reset_weekly_tasks, get_week_dates, get_all_worker_activity, get_all_admin_activity, get_admin_dashboard_snapshot, iter_activity_line_items, empty_activity_totals, add_to_activity_totals, eager_load_options, get_pending_approvals_page, count_pending_approvals, get_completion_history_page, get_completion_history_summary, bulk_update_completion_status, get_earnings_trends, attach_payout_values, TREND_INTERVALS, TREND_GROUPS
+
+bp = Blueprint('main', __name__)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load_user(int(user_id))
 
 # Authentication Routes
-@app.route('/')
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
         if current_user.is_admin():
-            return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('main.admin_dashboard'))
         else:
-            return redirect(url_for('worker_dashboard'))
-    return redirect(url_for('login'))
+            return redirect(url_for('main.worker_dashboard'))
+    return redirect(url_for('main.login'))
 
-@app.route('/about')
+@bp.route('/about')
 def about():
     return render_template('about.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = LoginForm()
     if form.validate_on_submit():
+        # Turn away throttled clients before the password hash runs
+        wait = login_throttle.retry_after(request.remote_addr, form.email.data)
+        if wait:
+            flash(f'Too many failed login attempts. Please try again in {(wait + 59) // 60} minutes.', 'danger')
+            response = make_response(render_template('login.html', form=form), 429)
+            response.headers['Retry-After'] = str(wait)
+            return response
+        
         user = User.query.filter_by(email=form.email.data).first()
         if user and user.check_password(form.password.data) and user.is_active:
+            login_throttle.clear_account(form.email.data)
+            # Upgrade hashes made with older PASSWORD_HASH_METHOD parameters
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+            db.session.commit()
             login_user(user)
             next_page = request.args.get('next')
             flash(f'Welcome back, {user.get_full_name()}!', 'success')
-            return redirect(next_page) if next_page else redirect(url_for('index'))
+            return redirect(next_page) if next_page else redirect(url_for('main.index'))
         else:
+            login_throttle.record_failure(request.remote_addr, form.email.data)
+            db.session.commit()
             flash('Invalid email or password.', 'danger')
     
     return render_template('login.html', form=form)
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = RegisterForm()
     if form.validate_on_submit():
@@ -70,6 +95,7 @@ def register():
                 admin = User.query.filter_by(email=form.admin_email.data, role='admin').first()
                 if admin:
                     user.admin_id = admin.id
+                    data_version.bump(admin.id)
                 else:
                     flash('Admin not found. Please check the admin email address.', 'danger')
                     return render_template('register.html', form=form)
@@ -78,7 +104,7 @@ def register():
             db.session.commit()
             
             flash('Registration successful! Please log in.', 'success')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
             
         except Exception as e:
             db.session.rollback()
@@ -86,50 +112,49 @@ def register():
     
     return render_template('register.html', form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash('You have been logged out.', 'info')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
-@app.route('/forgot-password', methods=['GET', 'POST'])
+@bp.route('/forgot-password', methods=['GET', 'POST'])
 def forgot_password():
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     form = ForgotPasswordForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
         if user:
-            # Generate reset token
+            # Generate reset token and queue the email in the same transaction
             token = user.generate_reset_token()
-            db.session.commit()
-            
-            # Send email
             from email_utils import send_password_reset_email
             if send_password_reset_email(user, token):
+                db.session.commit()
                 flash('Password reset instructions have been sent to your email address.', 'success')
             else:
+                db.session.rollback()
                 flash('Failed to send password reset email. Please try again later.', 'danger')
         else:
             # Don't reveal if email exists - security measure
             flash('Password reset instructions have been sent to your email address.', 'success')
         
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('forgot_password.html', form=form)
 
-@app.route('/reset-password/<token>', methods=['GET', 'POST'])
+@bp.route('/reset-password/<token>', methods=['GET', 'POST'])
 def reset_password(token):
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     # Find user with this token
     user = User.query.filter_by(reset_token=token).first()
     if not user or not user.verify_reset_token(token):
         flash('The password reset link is invalid or has expired.', 'danger')
-        return redirect(url_for('forgot_password'))
+        return redirect(url_for('main.forgot_password'))
     
     form = ResetPasswordForm()
     if form.validate_on_submit():
@@ -137,48 +162,21 @@ def reset_password(token):
         user.clear_reset_token()
         db.session.commit()
         flash('Your password has been reset successfully. Please log in with your new password.', 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('reset_password.html', form=form, token=token)
 
 # Admin Routes
-@app.route('/admin')
+@bp.route('/admin')
 @admin_required
+@conditional
 def admin_dashboard():
-    # Get admin's workers
-    workers = User.query.filter_by(admin_id=current_user.id, role='worker', is_active=True).all()
-    
-    # Get pending approvals
-    pending_approvals = get_pending_approvals(current_user.id)
-    
-    # Get this week's payment totals
-    start_of_week, end_of_week = get_week_dates()
-    week_payments = calculate_admin_payments(current_user.id, start_of_week, end_of_week)
-    
-    # Calculate total awaiting payment (approved but not paid tasks)
-    awaiting_payment_total = db.session.query(func.sum(Task.monetary_value)).join(TaskCompletion).filter(
-        Task.created_by == current_user.id,
-        TaskCompletion.status == 'approved'
-    ).scalar() or 0.0
-    
-    # Get active tasks count
-    active_tasks = Task.query.filter_by(created_by=current_user.id, is_active=True).count()
-    
-    # Get payment summary for each worker
-    worker_payment_data = {}
-    for worker in workers:
-        worker_payment_data[worker.id] = get_worker_payment_summary(worker.id)
-    
-    return render_template('admin_dashboard.html', 
-                         workers=workers,
-                         pending_count=len(pending_approvals),
-                         week_total=week_payments['grand_total'],
-                         awaiting_payment_total=awaiting_payment_total,
-                         active_tasks=active_tasks,
-                         worker_payment_data=worker_payment_data)
-
-@app.route('/admin/tasks')
+    snapshot = get_admin_dashboard_snapshot(current_user.id)
+    return render_template('admin_dashboard.html', snapshot=snapshot)
+
+@bp.route('/admin/tasks')
 @admin_required
+@conditional
 def task_list():
     # Get filter parameters from request args
     category_filter = request.args.get('category', 'all')
@@ -206,22 +204,17 @@ def task_list():
     
     tasks = query.order_by(Task.created_at.desc()).all()
     
-    # Get unique categories for filter dropdown
-    all_tasks = Task.query.filter_by(created_by=current_user.id).all()
-    categories = set()
-    for task in all_tasks:
-        if task.category and task.category.strip():
-            categories.add(task.category)
-    categories = sorted(list(categories))
+    # Category, priority and status counts for the filter dropdowns
+    facets = get_task_facets(current_user.id)
     
     return render_template('task_list.html', 
                          tasks=tasks, 
-                         categories=categories,
+                         facets=facets,
                          current_category=category_filter,
                          current_priority=priority_filter,
                          current_status=status_filter)
 
-@app.route('/admin/tasks/new', methods=['GET', 'POST'])
+@bp.route('/admin/tasks/new', methods=['GET', 'POST'])
 @admin_required
 def create_task():
     form = TaskForm()
@@ -235,13 +228,14 @@ def create_task():
             created_by=current_user.id
         )
         db.session.add(task)
+        data_version.bump(current_user.id)
         db.session.commit()
         flash('Task created successfully!', 'success')
-        return redirect(url_for('task_list'))
+        return redirect(url_for('main.task_list'))
     
     return render_template('task_form.html', form=form, title='Create New Task')
 
-@app.route('/admin/tasks/<int:task_id>/edit', methods=['GET', 'POST'])
+@bp.route('/admin/tasks/<int:task_id>/edit', methods=['GET', 'POST'])
 @admin_required
 def edit_task(task_id):
     task = Task.query.get_or_404(task_id)
@@ -250,15 +244,18 @@ def edit_task(task_id):
     
     form = TaskForm(obj=task)
     if form.validate_on_submit():
+        old_value = task.monetary_value
         form.populate_obj(task)
         task.updated_at = datetime.now(timezone.utc)
+        ledger.record_task_value_change(task, old_value)
+        data_version.bump(current_user.id)
         db.session.commit()
         flash('Task updated successfully!', 'success')
-        return redirect(url_for('task_list'))
+        return redirect(url_for('main.task_list'))
     
     return render_template('task_form.html', form=form, task=task, title='Edit Task')
 
-@app.route('/admin/tasks/<int:task_id>/delete', methods=['POST'])
+@bp.route('/admin/tasks/<int:task_id>/delete', methods=['POST'])
 @admin_required
 def delete_task(task_id):
     task = Task.query.get_or_404(task_id)
@@ -266,11 +263,12 @@ def delete_task(task_id):
         abort(403)
     
     task.is_active = False
+    data_version.bump(current_user.id)
     db.session.commit()
     flash('Task deactivated successfully!', 'success')
-    return redirect(url_for('task_list'))
+    return redirect(url_for('main.task_list'))
 
-@app.route('/admin/tasks/<int:task_id>/reactivate', methods=['POST'])
+@bp.route('/admin/tasks/<int:task_id>/reactivate', methods=['POST'])
 @admin_required
 def reactivate_task(task_id):
     task = Task.query.get_or_404(task_id)
@@ -278,17 +276,24 @@ def reactivate_task(task_id):
         abort(403)
     
     task.is_active = True
+    data_version.bump(current_user.id)
     db.session.commit()
     flash('Task reactivated successfully!', 'success')
-    return redirect(url_for('task_list'))
+    return redirect(url_for('main.task_list'))
 
-@app.route('/admin/approvals')
+@bp.route('/admin/approvals')
 @admin_required
+@conditional
 def approval_queue():
-    pending_approvals = get_pending_approvals(current_user.id)
-    return render_template('approval_queue.html', approvals=pending_approvals)
+    cursor = request.args.get('cursor')
+    pending_approvals, next_cursor = get_pending_approvals_page(current_user.id, cursor)
+    return render_template('approval_queue.html',
+                         approvals=pending_approvals,
+                         pending_count=count_pending_approvals(current_user.id),
+                         cursor=cursor,
+                         next_cursor=next_cursor)
 
-@app.route('/admin/approve/<int:completion_id>', methods=['POST'])
+@bp.route('/admin/approve/<int:completion_id>', methods=['POST'])
 @admin_required
 def approve_completion(completion_id):
     completion = TaskCompletion.query.get_or_404(completion_id)
@@ -302,10 +307,14 @@ def approve_completion(completion_id):
     admin_notes = request.form.get('admin_notes', '')
     
     if status and status in ['approved', 'rejected', 'paid']:
+        ledger.record_status_change(completion, completion.status, status)
+        if completion.status != status:
+            digests.record_change(completion, status)
         completion.status = status
         completion.admin_notes = admin_notes
         completion.reviewed_at = datetime.now(timezone.utc)
         completion.reviewed_by = current_user.id
+        data_version.bump(current_user.id)
         
         db.session.commit()
         
@@ -319,9 +328,32 @@ def approve_completion(completion_id):
     else:
         flash('Invalid approval status provided.', 'error')
     
-    return redirect(url_for('approval_queue'))
+    return redirect(url_for('main.approval_queue'))
+
+@bp.route('/admin/completions/bulk', methods=['POST'])
+@admin_required
+def bulk_update_completions():
+    status = request.form.get('status')
+    completion_ids = request.form.getlist('completion_ids', type=int)
+    worker_id = request.form.get('worker_id', type=int)
+    admin_notes = request.form.get('admin_notes', '')
+    
+    week_start = request.form.get('week_start')
+    if week_start:
+        try:
+            week_start = datetime.strptime(week_start, '%Y-%m-%d').date()
+        except ValueError:
+            flash('Invalid week provided.', 'error')
+            return redirect(url_for('main.approval_queue'))
+    
+    success, message = bulk_update_completion_status(current_user.id, status, completion_ids, worker_id, week_start, admin_notes)
+    flash(message, 'success' if success else 'danger')
+    
+    if request.form.get('return_to') == 'admin_dashboard':
+        return redirect(url_for('main.admin_dashboard'))
+    return redirect(url_for('main.approval_queue'))
 
-@app.route('/admin/mark_paid/<int:completion_id>', methods=['POST'])
+@bp.route('/admin/mark_paid/<int:completion_id>', methods=['POST'])
 @admin_required
 def mark_as_paid(completion_id):
     completion = TaskCompletion.query.get_or_404(completion_id)
@@ -333,19 +365,23 @@ def mark_as_paid(completion_id):
     # Only allow marking approved tasks as paid
     if completion.status != 'approved':
         flash('Only approved tasks can be marked as paid.', 'error')
-        return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('main.admin_dashboard'))
     
+    ledger.record_status_change(completion, completion.status, 'paid')
+    digests.record_change(completion, 'paid')
     completion.status = 'paid'
     completion.reviewed_at = datetime.now(timezone.utc)
     completion.reviewed_by = current_user.id
+    data_version.bump(current_user.id)
     
     db.session.commit()
     
     flash(f'Task "{completion.task.title}" marked as paid for {completion.worker.get_full_name()}!', 'success')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
-@app.route('/admin/reports', methods=['GET', 'POST'])
+@bp.route('/admin/reports', methods=['GET', 'POST'])
 @admin_required
+@conditional
 def reports():
     form = ReportForm()
     
@@ -380,7 +416,18 @@ def reports():
             priority_filter = 'all'
             task_status_filter = 'all'
         
-        if worker_id == -1:
+        if form.report_type.data == 'trends':
+            # Trends - totals per day/week/month for each worker or category, for all workers or one
+            if worker_id != -1 and not owns_worker(worker_id):
+                abort(403)
+            report_data = {
+                'trends': get_earnings_trends(current_user.id, start_date, end_date, form.trend_interval.data, form.trend_group_by.data,
+                                              None if worker_id == -1 else worker_id, status_filter, priority_filter, task_status_filter),
+                'interval': form.trend_interval.data,
+                'group_by': form.trend_group_by.data,
+                'period': f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
+            }
+        elif worker_id == -1:
             # All workers report - show activity based on status, priority, and task status filters
             report_data = get_all_admin_activity(current_user.id, start_date, end_date, status_filter, priority_filter, task_status_filter)
             report_data['single_worker'] = False
@@ -400,48 +447,69 @@ def reports():
     
     return render_template('reports.html', form=form, report_data=report_data)
 
-@app.route('/admin/reports/export')
+class _CsvRowEcho:
+    """File-like object for csv.writer that hands each formatted row back instead of buffering it"""
+    def write(self, value):
+        return value
+
+def _report_filter_text(status_filter, priority_filter, task_status_filter):
+    """Describe the active report filters for the CSV title row"""
+    filter_parts = []
+    if status_filter != 'all':
+        filter_parts.append(status_filter.title())
+    if priority_filter != 'all':
+        filter_parts.append(f"{priority_filter.title()} Priority")
+    if task_status_filter != 'all':
+        filter_parts.append(f"{task_status_filter.title()} Tasks")
+    return f" ({', '.join(filter_parts)})" if filter_parts else ""
+
+@bp.route('/admin/reports/export')
 @admin_required
+@conditional
 def export_report():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    worker_id = request.args.get('worker_id', type=int)
+    worker_id = request.args.get('worker_id', -1, type=int)
     status_filter = request.args.get('status_filter', 'all')
     priority_filter = request.args.get('priority_filter', 'all')
     task_status_filter = request.args.get('task_status_filter', 'all')
+    # 'summary' (one row per worker) or 'line_items' (every completion); single worker exports are always line items
+    detail = request.args.get('detail', 'summary')
+    # report_type=trends exports one row per period and worker/category instead
+    report_type = request.args.get('report_type', 'totals')
+    trend_interval = request.args.get('trend_interval', 'week')
+    trend_group_by = request.args.get('trend_group_by', 'worker')
+    if report_type == 'trends' and (trend_interval not in TREND_INTERVALS or trend_group_by not in TREND_GROUPS):
+        abort(400)
     
     if not start_date or not end_date:
         flash('Missing date parameters for export.', 'danger')
-        return redirect(url_for('reports'))
+        return redirect(url_for('main.reports'))
     
     start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
     end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-    
-    # Create CSV content
-    output = StringIO()
-    writer = csv.writer(output)
+    filters = (status_filter, priority_filter, task_status_filter)
+    filter_text = _report_filter_text(*filters)
+    period = f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
+    admin_id = current_user.id
     
     if worker_id == -1:
-        # All workers report with status, priority, and task status filters
-        report_data = get_all_admin_activity(current_user.id, start_date, end_date, status_filter, priority_filter, task_status_filter)
-        filter_text = ""
-        if status_filter != 'all' or priority_filter != 'all' or task_status_filter != 'all':
-            filter_parts = []
-            if status_filter != 'all':
-                filter_parts.append(status_filter.title())
-            if priority_filter != 'all':
-                filter_parts.append(f"{priority_filter.title()} Priority")
-            if task_status_filter != 'all':
-                filter_parts.append(f"{task_status_filter.title()} Tasks")
-            filter_text = f" ({', '.join(filter_parts)})"
-        writer.writerow([f'Activity Report - All Workers{filter_text}', report_data['period']])
-        writer.writerow(['Worker Name', 'Tasks Completed', 'Total Value (£)', 'Paid (£)', 'Awaiting Payment (£)', 'Rejected (£)'])
+        workers = {w.id: w for w in User.query.filter_by(admin_id=admin_id, role='worker', is_active=True).all()}
+    else:
+        # Single worker report - ownership is checked before the response starts streaming
+        if not owns_worker(worker_id):
+            abort(403)
+        worker = User.query.get(worker_id)
+    
+    def generate_all_workers_summary(writer):
+        report_data = get_all_admin_activity(admin_id, start_date, end_date, *filters, include_completions=False)
+        yield writer.writerow([f'Activity Report - All Workers{filter_text}', report_data['period']])
+        yield writer.writerow(['Worker Name', 'Tasks Completed', 'Total Value (£)', 'Paid (£)', 'Awaiting Payment (£)', 'Rejected (£)'])
         
-        for worker_id, data in report_data['workers'].items():
-            worker = data['worker']
+        for data in report_data['workers'].values():
             activity_data = data['activity_data']
-            writer.writerow([
-                worker.get_full_name(), 
+            yield writer.writerow([
+                data['worker'].get_full_name(), 
                 activity_data['count'], 
                 f"£{activity_data['total_value']:.2f}",
                 f"£{activity_data['paid_total']:.2f}",
@@ -449,46 +517,87 @@ def export_report():
                 f"£{activity_data['rejected_total']:.2f}"
             ])
         
-        writer.writerow(['', 'Grand Total:', f"£{report_data['grand_total_value']:.2f}", f"£{report_data['grand_paid_total']:.2f}", f"£{report_data['grand_awaiting_payment']:.2f}", f"£{report_data['grand_rejected_total']:.2f}"])
-    else:
-        # Single worker report with status, priority, and task status filters
-        if not owns_worker(worker_id):
-            abort(403)
+        yield writer.writerow(['', 'Grand Total:', f"£{report_data['grand_total_value']:.2f}", f"£{report_data['grand_paid_total']:.2f}", f"£{report_data['grand_awaiting_payment']:.2f}", f"£{report_data['grand_rejected_total']:.2f}"])
+    
+    def generate_all_workers_line_items(writer):
+        yield writer.writerow([f'Activity Report - All Workers, Line Items{filter_text}', period])
+        yield writer.writerow(['Worker Name', 'Task', 'Completion Date', 'Value (£)', 'Status', 'Reviewed Date'])
         
-        worker = User.query.get(worker_id)
-        activity_data = get_all_worker_activity(worker_id, start_date, end_date, status_filter, priority_filter, task_status_filter)
-        filter_text = ""
-        if status_filter != 'all' or priority_filter != 'all' or task_status_filter != 'all':
-            filter_parts = []
-            if status_filter != 'all':
-                filter_parts.append(status_filter.title())
-            if priority_filter != 'all':
-                filter_parts.append(f"{priority_filter.title()} Priority")
-            if task_status_filter != 'all':
-                filter_parts.append(f"{task_status_filter.title()} Tasks")
-            filter_text = f" ({', '.join(filter_parts)})"
+        totals = empty_activity_totals()
+        for row in iter_activity_line_items(list(workers), start_date, end_date, *filters):
+            add_to_activity_totals(totals, row.status, row.value)
+            yield writer.writerow([
+                workers[row.worker_id].get_full_name(),
+                row.task_title,
+                row.completion_date.strftime('%d/%m/%Y'),
+                f"£{row.value:.2f}",
+                row.status.title(),
+                row.reviewed_at.strftime('%d/%m/%Y %H:%M') if row.reviewed_at else 'Pending'
+            ])
         
-        writer.writerow([f'Activity Report - {worker.get_full_name()}{filter_text}', f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"])
-        writer.writerow(['Task', 'Completion Date', 'Value (£)', 'Status', 'Reviewed Date'])
+        yield writer.writerow(['', '', 'Total:', f"£{totals['total_value']:.2f}", '', ''])
+        yield writer.writerow(['', '', 'Paid:', f"£{totals['paid_total']:.2f}", '', ''])
+        yield writer.writerow(['', '', 'Awaiting Payment:', f"£{totals['awaiting_payment']:.2f}", '', ''])
+        yield writer.writerow(['', '', 'Rejected:', f"£{totals['rejected_total']:.2f}", '', ''])
+    
+    def generate_single_worker(writer):
+        yield writer.writerow([f'Activity Report - {worker.get_full_name()}{filter_text}', period])
+        yield writer.writerow(['Task', 'Completion Date', 'Value (£)', 'Status', 'Reviewed Date'])
         
-        for completion in activity_data['completions']:
-            writer.writerow([
-                completion['task_title'],
-                completion['completion_date'].strftime('%d/%m/%Y'),
-                f"£{completion['value']:.2f}",
-                completion['status'].title(),
-                completion['reviewed_date'].strftime('%d/%m/%Y %H:%M') if completion['reviewed_date'] else 'Pending'
+        totals = empty_activity_totals()
+        for row in iter_activity_line_items([worker_id], start_date, end_date, *filters):
+            add_to_activity_totals(totals, row.status, row.value)
+            yield writer.writerow([
+                row.task_title,
+                row.completion_date.strftime('%d/%m/%Y'),
+                f"£{row.value:.2f}",
+                row.status.title(),
+                row.reviewed_at.strftime('%d/%m/%Y %H:%M') if row.reviewed_at else 'Pending'
             ])
         
-        writer.writerow(['', 'Total:', f"£{activity_data['total_value']:.2f}", '', ''])
-        writer.writerow(['', 'Paid:', f"£{activity_data['paid_total']:.2f}", '', ''])
-        writer.writerow(['', 'Awaiting Payment:', f"£{activity_data['awaiting_payment']:.2f}", '', ''])
-        writer.writerow(['', 'Rejected:', f"£{activity_data['rejected_total']:.2f}", '', ''])
-    
-    # Create response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
+        yield writer.writerow(['', 'Total:', f"£{totals['total_value']:.2f}", '', ''])
+        yield writer.writerow(['', 'Paid:', f"£{totals['paid_total']:.2f}", '', ''])
+        yield writer.writerow(['', 'Awaiting Payment:', f"£{totals['awaiting_payment']:.2f}", '', ''])
+        yield writer.writerow(['', 'Rejected:', f"£{totals['rejected_total']:.2f}", '', ''])
+    
+    def generate_trends(writer):
+        subject = worker.get_full_name() if worker_id != -1 else 'All Workers'
+        series = 'Worker' if trend_group_by == 'worker' else 'Category'
+        yield writer.writerow([f'{TREND_INTERVALS[trend_interval]} Trends - {subject}, per {series}{filter_text}', period])
+        yield writer.writerow(['Period Start', series, 'Tasks Completed', 'Total Value (£)', 'Earned (£)', 'Paid (£)', 'Awaiting Payment (£)', 'Rejected (£)'])
+        
+        trends = get_earnings_trends(admin_id, start_date, end_date, trend_interval, trend_group_by,
+                                     None if worker_id == -1 else worker_id, *filters)
+        for row in trends:
+            yield writer.writerow([
+                row['period_start'].strftime('%d/%m/%Y'),
+                row['label'],
+                row['count'],
+                f"£{row['total_value']:.2f}",
+                f"£{row['approved_total']:.2f}",
+                f"£{row['paid_total']:.2f}",
+                f"£{row['awaiting_payment']:.2f}",
+                f"£{row['rejected_total']:.2f}"
+            ])
+    
+    def generate():
+        writer = csv.writer(_CsvRowEcho())
+        if report_type == 'trends':
+            yield from generate_trends(writer)
+        elif worker_id != -1:
+            yield from generate_single_worker(writer)
+        elif detail == 'line_items':
+            yield from generate_all_workers_line_items(writer)
+        else:
+            yield from generate_all_workers_summary(writer)
+    
+    # Create response - rows are written to the client as they are read
+    response = Response(stream_with_context(generate()), mimetype='text/csv')
     suffix_parts = []
+    if report_type == 'trends':
+        suffix_parts += ['trends', trend_interval, trend_group_by]
+    elif worker_id == -1 and detail == 'line_items':
+        suffix_parts.append('line_items')
     if status_filter != 'all':
         suffix_parts.append(status_filter)
     if priority_filter != 'all':
@@ -500,16 +609,17 @@ def export_report():
     
     return response
 
-@app.route('/admin/reset-weekly', methods=['POST'])
+@bp.route('/admin/reset-weekly', methods=['POST'])
 @admin_required
 def reset_weekly():
     success, message = reset_weekly_tasks(current_user.id)
     flash(message, 'success' if success else 'danger')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('main.admin_dashboard'))
 
 # Worker Routes
-@app.route('/worker')
+@bp.route('/worker')
 @worker_required
+@conditional
 def worker_dashboard():
     # Get status filter from request args, default to 'active'
     status_filter = request.args.get('status', 'active')
@@ -537,7 +647,10 @@ def worker_dashboard():
         else:
             recent_query = recent_query.filter_by(status=completion_filter)
     
-    recent_completions = recent_query.order_by(TaskCompletion.submitted_at.desc()).limit(10).all()
+    recent_completions = recent_query.options(
+        *eager_load_options(joinedload(TaskCompletion.task))
+    ).order_by(TaskCompletion.submitted_at.desc()).limit(10).all()
+    attach_payout_values(recent_completions)
     
     return render_template('worker_dashboard.html', 
                          tasks=available_tasks,
@@ -546,7 +659,7 @@ def worker_dashboard():
                          current_status=status_filter,
                          current_completion_filter=completion_filter)
 
-@app.route('/worker/complete/<int:task_id>', methods=['GET', 'POST'])
+@bp.route('/worker/complete/<int:task_id>', methods=['GET', 'POST'])
 @worker_required
 def complete_task(task_id):
     task = Task.query.get_or_404(task_id)
@@ -567,14 +680,16 @@ def complete_task(task_id):
         if existing:
             if existing.status == 'rejected':
                 # Allow resubmission for rejected tasks - update the existing record
+                ledger.record_status_change(existing, existing.status, 'pending')
                 existing.status = 'pending'
                 existing.admin_notes = None  # Clear previous rejection notes
                 existing.submitted_at = datetime.now(timezone.utc)
                 existing.reviewed_at = None
                 existing.reviewed_by = None
+                data_version.bump(current_user.admin_id)
                 db.session.commit()
                 flash('Task completion resubmitted for approval!', 'success')
-                return redirect(url_for('worker_dashboard'))
+                return redirect(url_for('main.worker_dashboard'))
             elif existing.status in ['pending', 'approved']:
                 flash('You have already completed this task on the selected date.', 'warning')
         else:
@@ -584,34 +699,37 @@ def complete_task(task_id):
                 completion_date=form.completion_date.data
             )
             db.session.add(completion)
+            ledger.record_status_change(completion, None, 'pending')
+            data_version.bump(current_user.admin_id)
             db.session.commit()
             flash('Task completion submitted for approval!', 'success')
-            return redirect(url_for('worker_dashboard'))
+            return redirect(url_for('main.worker_dashboard'))
     
     return render_template('task_form.html', form=form, task=task, title='Complete Task')
 
-@app.route('/worker/history')
+@bp.route('/worker/history')
 @worker_required
+@conditional
 def completion_history():
     # Get filter parameter from request args
     status_filter = request.args.get('filter', 'all')
-    
-    # Start with base query
-    query = TaskCompletion.query.filter_by(worker_id=current_user.id)
-    
-    # Apply status filter
-    if status_filter != 'all':
-        if status_filter == 'awaiting_payment':
-            query = query.filter_by(status='approved')
-        else:
-            query = query.filter_by(status=status_filter)
-    
-    completions = query.order_by(TaskCompletion.submitted_at.desc()).all()
-    return render_template('completion_history.html', completions=completions, current_filter=status_filter)
+    cursor = request.args.get('cursor')
+    
+    # One page of rows, plus summary figures for the whole filtered history
+    completions, next_cursor = get_completion_history_page(current_user.id, status_filter, cursor)
+    summary = get_completion_history_summary(current_user.id, status_filter)
+    
+    return render_template('completion_history.html',
+                         completions=completions,
+                         summary=summary,
+                         current_filter=status_filter,
+                         cursor=cursor,
+                         next_cursor=next_cursor)
 
 # Profile Routes
-@app.route('/profile', methods=['GET', 'POST'])
+@bp.route('/profile', methods=['GET', 'POST'])
 @login_required
+@conditional
 def profile():
     # Password change form
     password_form = ChangePasswordForm(current_user)
@@ -620,7 +738,7 @@ def profile():
         current_user.set_password(password_form.new_password.data)
         db.session.commit()
         flash('Password updated successfully!', 'success')
-        return redirect(url_for('profile'))
+        return redirect(url_for('main.profile'))
     
     # If worker, get stats for the profile page
     worker_stats = None
@@ -629,7 +747,7 @@ def profile():
     
     return render_template('profile.html', worker_stats=worker_stats, password_form=password_form)
 
-@app.route('/delete-account', methods=['GET', 'POST'])
+@bp.route('/delete-account', methods=['GET', 'POST'])
 @login_required
 def delete_account():
     delete_form = DeleteAccountForm(current_user)
@@ -648,12 +766,15 @@ def delete_account():
             
             # Delete all tasks created by admin (cascade will handle completions)
             Task.query.filter_by(created_by=current_user.id).delete()
+            ledger.remove_admin(current_user.id)
         
         elif current_user.is_worker():
             # Delete all task completions by this worker
             TaskCompletion.query.filter_by(worker_id=current_user.id).delete()
+            ledger.remove_worker(current_user.id)
         
         # Delete the user account
+        data_version.bump(data_version.household_id(current_user))
         db.session.delete(current_user)
         db.session.commit()
         
@@ -661,25 +782,32 @@ def delete_account():
         logout_user()
         
         flash(f'Account {user_email} ({user_role}) has been permanently deleted.', 'info')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
     
     return render_template('delete_account.html', form=delete_form)
 
 # Error Handlers
-@app.errorhandler(403)
+@bp.app_errorhandler(403)
 def forbidden(error):
     return render_template('403.html'), 403
 
-@app.errorhandler(404)
+@bp.app_errorhandler(404)
 def not_found(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('500.html'), 500
 
+@bp.app_errorhandler(PoolTimeoutError)
+def pool_exhausted(error):
+    # No connection came free within DB_POOL_TIMEOUT: shed the request rather than queue
+    # behind the pool; a plain page, since rendering templates would need the database
+    db.session.rollback()
+    return ServiceUnavailable(retry_after=5)
+
 # Context Processors
-@app.context_processor
+@bp.app_context_processor
 def inject_user():
     return dict(current_user=current_user)
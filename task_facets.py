@@ -0,0 +1,78 @@
+"""Facet counts for the admin task list filters.
+
+get_task_facets() returns, for one admin's tasks, each category with its
+task count plus counts by priority and by active/inactive status, from a
+single GROUP BY query. Results are cached per admin for TASK_FACETS_CACHE_TTL
+seconds, tagged with the household data version they were computed at.
+Creating, editing, deactivating or reactivating a task bumps that version
+(see data_version.py), so a write in any worker process makes every
+process recompute on its next read.
+"""
+from dataclasses import dataclass, field
+
+from flask import current_app
+from sqlalchemy import func
+
+from app import db
+from models import Task
+from cache import TTLCache
+import data_version
+
+PRIORITIES = ('high', 'normal', 'low')
+
+
+@dataclass
+class TaskFacets:
+    """Counts behind the task list filter dropdowns"""
+    categories: list = field(default_factory=list)  # (category, count), sorted by category
+    uncategorized: int = 0
+    priorities: dict = field(default_factory=lambda: dict.fromkeys(PRIORITIES, 0))
+    active: int = 0
+    inactive: int = 0
+    total: int = 0
+
+
+def init_app(app):
+    app.extensions['task_facets'] = TTLCache(app.config['TASK_FACETS_CACHE_TTL'], app.config['TASK_FACETS_CACHE_SIZE'])
+
+
+def _compute_task_facets(admin_id):
+    rows = db.session.query(
+        Task.category, Task.priority, Task.is_active, func.count(Task.id)
+    ).filter(Task.created_by == admin_id).group_by(Task.category, Task.priority, Task.is_active).all()
+
+    facets = TaskFacets()
+    categories = {}
+    for category, priority, is_active, count in rows:
+        facets.total += count
+        # Matches the task list's 'none' filter: NULL or empty
+        if not category:
+            facets.uncategorized += count
+        elif category.strip():
+            categories[category] = categories.get(category, 0) + count
+        if priority in facets.priorities:
+            facets.priorities[priority] += count
+        if is_active is True:
+            facets.active += count
+        elif is_active is False:
+            facets.inactive += count
+    facets.categories = sorted(categories.items())
+    return facets
+
+
+def get_task_facets(admin_id):
+    """Category, priority and status counts for an admin's tasks, cached until the household's data changes"""
+    if current_app.config['TASK_FACETS_CACHE_TTL'] <= 0:
+        return _compute_task_facets(admin_id)
+    cache = current_app.extensions['task_facets']
+    version, _ = data_version.current(admin_id)
+    cached = cache.get(admin_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    facets = _compute_task_facets(admin_id)
+    cache.set(admin_id, (version, facets))
+    return facets
+
+
+def invalidate(admin_id):
+    current_app.extensions['task_facets'].delete(admin_id)
@@ -0,0 +1,33 @@
+"""Test configuration: an app of its own, on a scratch SQLite database and a local SMTP port."""
+import os
+import socket
+import tempfile
+
+import pytest
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    from migrations import upgrade
+
+    tmpdir = tempfile.mkdtemp(prefix='home-task-tracker-tests-')
+    app = create_app({
+        'SECRET_KEY': 'test-secret',
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(tmpdir, "test.sqlite")}',
+        'MAIL_SERVER': '127.0.0.1',
+        'MAIL_PORT': _free_port(),
+        'MAIL_USE_TLS': False,
+        'MAIL_USERNAME': None,
+        'MAIL_PASSWORD': None,
+        'MAIL_DEFAULT_SENDER': 'tasks@example.com',
+    })
+    with app.app_context():
+        upgrade()
+        yield app
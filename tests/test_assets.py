@@ -0,0 +1,23 @@
+"""assets.minify() on JavaScript that a naive minifier would corrupt."""
+from assets import minify
+
+SOURCE = '''function matches(s) {
+    return /a +b/.test(s) || typeof s === 'string' && s.split(/ +/).length > 1;
+}
+function label(x) {
+    switch (x) { case 1: return /^ [a-z]+ $/i; }
+    return `outer ${x ? `inner ${x} // not a comment` : 'none'} end`;
+}
+'''
+
+
+def test_regex_after_keyword_is_kept():
+    output = minify('js/app.js', SOURCE)
+    assert '/a +b/' in output
+    assert '/^ [a-z]+ $/i' in output
+    assert '/ +/' in output
+
+
+def test_nested_template_literals_are_kept():
+    output = minify('js/app.js', SOURCE)
+    assert "`outer ${x ? `inner ${x} // not a comment` : 'none'} end`" in output
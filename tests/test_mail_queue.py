@@ -0,0 +1,190 @@
+"""mail_queue delivery against an in-process SMTP server (aiosmtpd)."""
+import email
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiosmtpd.controller import Controller
+from flask_mail import Message
+
+from app import db
+from models import OutboundEmail, User
+import mail_queue
+from email_utils import send_password_reset_email
+
+
+class StandInHandler:
+    """Accepts every message, unless told to answer the next ones with an error reply"""
+
+    def __init__(self):
+        self.received = []
+        self.replies = []
+        self.on_data = None
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.on_data:
+            self.on_data()
+        if self.replies:
+            return self.replies.pop(0)
+        self.received.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+@pytest.fixture
+def smtp(app):
+    handler = StandInHandler()
+    controller = Controller(handler, hostname=app.config['MAIL_SERVER'], port=app.config['MAIL_PORT'])
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(app):
+    OutboundEmail.query.delete()
+    db.session.commit()
+    yield
+    # A fresh session per test: SQLite reuses the deleted rows' ids
+    db.session.remove()
+
+
+def _queue(subject='Hello'):
+    queued = mail_queue.enqueue(Message(subject=subject, recipients=['worker@example.com'], body='Hi'))
+    db.session.commit()
+    return queued.id
+
+
+def _reload(email_id):
+    db.session.expire_all()
+    return db.session.get(OutboundEmail, email_id)
+
+
+def _make_due(email_id):
+    queued = _reload(email_id)
+    queued.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.session.commit()
+
+
+def _utcnow():
+    # SQLite hands stored datetimes back naive
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def test_queued_email_is_delivered(app, smtp):
+    user = User(first_name='Ada', last_name='Lovelace', email='ada@example.com')
+    with app.test_request_context():
+        assert send_password_reset_email(user, 'token123')
+    db.session.commit()
+
+    assert mail_queue.deliver_due() == (1, 0)
+
+    assert len(smtp.received) == 1
+    envelope = smtp.received[0]
+    assert envelope.rcpt_tos == ['ada@example.com']
+    assert envelope.mail_from == 'tasks@example.com'
+    message = email.message_from_bytes(envelope.content)
+    assert message['Subject'] == 'Home Task Tracker - Password Reset Request'
+    assert b'token123' in envelope.content
+
+    sent = OutboundEmail.query.one()
+    assert sent.status == 'sent'
+    assert sent.attempts == 1
+    assert sent.sent_at is not None
+    assert sent.last_error is None
+    assert mail_queue.deliver_due() == (0, 0)
+
+
+def test_transient_failure_is_retried_with_backoff(app, smtp, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_QUEUE_RETRY_SECONDS', 60)
+    smtp.replies = ['451 4.3.0 Try again later', '451 4.3.0 Try again later']
+    email_id = _queue()
+
+    before = _utcnow()
+    assert mail_queue.deliver_due() == (0, 1)
+    queued = _reload(email_id)
+    assert queued.status == 'queued'
+    assert queued.attempts == 1
+    assert 'SMTPDataError' in queued.last_error
+    assert before + timedelta(seconds=60) <= queued.next_attempt_at <= _utcnow() + timedelta(seconds=66)
+
+    # Not due yet, so the next pass leaves it alone
+    assert mail_queue.deliver_due() == (0, 0)
+
+    # The delay doubles with each failed attempt
+    _make_due(email_id)
+    before = _utcnow()
+    assert mail_queue.deliver_due() == (0, 1)
+    queued = _reload(email_id)
+    assert queued.attempts == 2
+    assert before + timedelta(seconds=120) <= queued.next_attempt_at <= _utcnow() + timedelta(seconds=132)
+
+    _make_due(email_id)
+    assert mail_queue.deliver_due() == (1, 0)
+    queued = _reload(email_id)
+    assert queued.status == 'sent'
+    assert queued.attempts == 3
+    assert queued.last_error is None
+    assert len(smtp.received) == 1
+
+
+def test_email_is_dead_lettered_after_max_attempts(app, smtp, monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_QUEUE_MAX_ATTEMPTS', 3)
+    smtp.replies = ['451 4.3.0 Try again later'] * 3
+    email_id = _queue()
+
+    for attempt in range(1, 4):
+        assert mail_queue.deliver_due() == (0, 1)
+        queued = _reload(email_id)
+        assert queued.attempts == attempt
+        if attempt < 3:
+            assert queued.status == 'queued'
+            _make_due(email_id)
+
+    assert queued.status == 'dead'
+    assert '451' in queued.last_error
+    _make_due(email_id)
+    assert mail_queue.deliver_due() == (0, 0)
+    assert smtp.received == []
+
+
+def test_permanent_rejection_is_dead_lettered_at_once(app, smtp):
+    smtp.replies = ['550 5.1.1 Mailbox unavailable']
+    email_id = _queue()
+
+    assert mail_queue.deliver_due() == (0, 1)
+    queued = _reload(email_id)
+    assert queued.status == 'dead'
+    assert queued.attempts == 1
+
+
+def test_batch_is_claimed_and_committed_before_sending(app, smtp):
+    email_id = _queue()
+    database = db.engine.url.database
+    seen = []
+
+    # Another connection's view of the row while the SMTP conversation is under way
+    def read_status():
+        with sqlite3.connect(database) as connection:
+            seen.append(connection.execute('SELECT status FROM outbound_emails WHERE id = ?', (email_id,)).fetchone()[0])
+    smtp.on_data = read_status
+
+    assert mail_queue.deliver_due() == (1, 0)
+    assert seen == ['sending']
+    assert _reload(email_id).status == 'sent'
+
+
+def test_expired_lease_is_claimed_again(app, smtp):
+    email_id = _queue()
+    claimed = _reload(email_id)
+    claimed.status = 'sending'
+    claimed.next_attempt_at = datetime.now(timezone.utc) + timedelta(minutes=5)
+    db.session.commit()
+
+    # Another worker still holds the lease
+    assert mail_queue.deliver_due() == (0, 0)
+    assert smtp.received == []
+
+    _make_due(email_id)
+    assert mail_queue.deliver_due() == (1, 0)
+    assert _reload(email_id).status == 'sent'
+    assert len(smtp.received) == 1
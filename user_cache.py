@@ -0,0 +1,168 @@
+"""Cache of the user identity that Flask-Login loads on every request.
+
+load_user() serves current_user from a bounded TTL + LRU cache instead of
+querying users each request. Only non-secret columns are cached; the cached
+snapshot is merged into the session without SQL, so password checks, lazy
+relationships and writes on current_user still go to the database.
+
+Every committed update or delete of a User (password change or reset, role or
+activation change, account deletion) bumps the household data version (see
+data_version.py), and each cached snapshot is tagged with the version it was
+read at. A snapshot is only served while its household's version is
+unchanged, so a change made in any worker process reaches every process on
+its next request; the version read is the one the ETag and fragment caches
+use anyway. The process that made the change also evicts the user at once.
+
+The cache is per process by default; set USER_CACHE_URL (a Redis URL) to
+share one between the gunicorn workers.
+"""
+import json
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import make_transient_to_detached, object_session
+
+from app import db
+from models import User
+from cache import TTLCache
+import data_version
+
+# Secrets are left out and lazy-load from the database when accessed
+CACHED_COLUMNS = ('id', 'email', 'role', 'admin_id', 'first_name', 'last_name', 'is_active', 'created_at', 'updated_at')
+DATETIME_COLUMNS = ('created_at', 'updated_at')
+
+
+class _RedisBackend:
+    """Shared cache for several worker processes (needs the redis package)"""
+
+    def __init__(self, url, ttl):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('USER_CACHE_URL is set but the redis package is not installed') from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f'user-cache:{user_id}'
+
+    def get(self, user_id):
+        raw = self.client.get(self._key(user_id))
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        for name in DATETIME_COLUMNS:
+            if data.get(name):
+                data[name] = datetime.fromisoformat(data[name])
+        return data
+
+    def set(self, user_id, data):
+        raw = json.dumps(data, default=lambda value: value.isoformat())
+        self.client.set(self._key(user_id), raw, ex=self.ttl)
+
+    def delete(self, user_id):
+        self.client.delete(self._key(user_id))
+
+    def clear(self):
+        for key in self.client.scan_iter('user-cache:*'):
+            self.client.delete(key)
+
+
+def _create_backend(app):
+    ttl = app.config['USER_CACHE_TTL']
+    if ttl <= 0:
+        return None
+    if app.config['USER_CACHE_URL']:
+        return _RedisBackend(app.config['USER_CACHE_URL'], ttl)
+    return TTLCache(ttl, app.config['USER_CACHE_SIZE'])
+
+
+def init_app(app):
+    app.extensions['user_cache'] = _create_backend(app)
+
+
+def _backend():
+    return current_app.extensions.get('user_cache')
+
+
+def _household(data):
+    return data['id'] if data['role'] == 'admin' else data['admin_id']
+
+
+def _snapshot(user, version):
+    data = {name: getattr(user, name) for name in CACHED_COLUMNS}
+    data['household_version'] = version
+    return data
+
+
+def _from_snapshot(data):
+    """Attach a cached snapshot to the session as a clean persistent User, without SQL"""
+    user = User(**{name: data[name] for name in CACHED_COLUMNS})
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def load_user(user_id):
+    """Return the active user with this id, or None to log the session out"""
+    backend = _backend()
+    data = backend.get(user_id) if backend is not None else None
+    # Serve the snapshot only while nothing in its household has changed since it was read
+    if data is not None and data_version.current(_household(data))[0] == data['household_version']:
+        user = _from_snapshot(data)
+    else:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        household = data_version.household_id(user)
+        if backend is not None and household is not None:
+            backend.set(user_id, _snapshot(user, data_version.current(household)[0]))
+    return user if user.is_active else None
+
+
+def invalidate(user_id):
+    backend = _backend()
+    if backend is not None:
+        backend.delete(user_id)
+
+
+def clear():
+    backend = _backend()
+    if backend is not None:
+        backend.clear()
+
+
+# Retire changed users' snapshots in every process: bump their household's
+# version in the same transaction as the change
+@event.listens_for(db.session, 'before_flush')
+def _bump_changed_users(session, flush_context, instances):
+    changed = [user for user in session.dirty if isinstance(user, User) and session.is_modified(user)]
+    changed += [user for user in session.deleted if isinstance(user, User)]
+    households = set()
+    for user in changed:
+        households.add(data_version.household_id(user))
+        # A worker moved to another household is also gone from the old one
+        households.update(inspect(user).attrs.admin_id.history.deleted or ())
+    for household in households:
+        data_version.bump(household)
+
+
+# Evict users whose rows changed once the change is committed, so this process
+# reloads them at once (or finds them gone)
+def _changed_user(mapper, connection, target):
+    object_session(target).info.setdefault('user_cache_invalidate', set()).add(target.id)
+
+
+event.listen(User, 'after_update', _changed_user)
+event.listen(User, 'after_delete', _changed_user)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_after_commit(session):
+    for user_id in session.info.pop('user_cache_invalidate', ()):
+        invalidate(user_id)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_after_rollback(session):
+    session.info.pop('user_cache_invalidate', None)
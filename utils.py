@@ -1,7 +1,14 @@
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
 from decimal import Decimal
-from models import TaskCompletion, Task, User
+from flask import current_app
+from sqlalchemy import func, case, and_, select, tuple_, cast, literal_column
+from sqlalchemy.orm import contains_eager, joinedload, raiseload
+from models import TaskCompletion, Task, User, EarningsRollup, PayoutSnapshot
 from app import db
+import ledger
+import digests
+import data_version
 
 def get_week_dates(date_obj=None):
     """Get start and end dates of the week containing the given date"""
@@ -15,9 +22,311 @@ def get_week_dates(date_obj=None):
     
     return start_of_week, end_of_week
 
+def eager_load_options(*loaders):
+    """Loader options for a list query: the relationships the view needs, loaded up front
+    
+    With STRICT_LOADING enabled every other relationship on the returned rows
+    raises instead of lazy loading, so an unplanned per-row SELECT fails
+    loudly in tests rather than slipping into production.
+    """
+    options = list(loaders)
+    if current_app.config.get('STRICT_LOADING'):
+        options.append(raiseload('*', sql_only=True))
+    return options
+
+class _LiveEarnings:
+    """Earnings aggregates computed from task_completions joined to tasks"""
+    def __init__(self):
+        self.status = TaskCompletion.status
+        self.day = TaskCompletion.completion_date
+        self.worker_id = TaskCompletion.worker_id
+        self.admin_id = Task.created_by
+    
+    def count(self, condition=None):
+        """COUNT of completions, optionally only those matching condition"""
+        if condition is None:
+            return func.count(TaskCompletion.id)
+        return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+    
+    def total(self, condition=None):
+        """SUM of task value, optionally only for completions matching condition"""
+        value = Task.monetary_value if condition is None else case((condition, Task.monetary_value), else_=None)
+        return func.coalesce(func.sum(value), 0)
+    
+    def query(self, *columns):
+        return db.session.query(*columns).select_from(TaskCompletion).join(Task, TaskCompletion.task_id == Task.id)
+
+class _RollupEarnings:
+    """Earnings aggregates read from the earnings_rollups table maintained by ledger.py"""
+    def __init__(self):
+        self.status = EarningsRollup.status
+        self.day = EarningsRollup.day
+        self.worker_id = EarningsRollup.worker_id
+        self.admin_id = EarningsRollup.admin_id
+    
+    def count(self, condition=None):
+        value = EarningsRollup.completion_count if condition is None else case((condition, EarningsRollup.completion_count), else_=0)
+        return func.coalesce(func.sum(value), 0)
+    
+    def total(self, condition=None):
+        value = EarningsRollup.amount if condition is None else case((condition, EarningsRollup.amount), else_=None)
+        return func.coalesce(func.sum(value), 0)
+    
+    def query(self, *columns):
+        return db.session.query(*columns).select_from(EarningsRollup)
+
+class _SnapshotEarnings:
+    """Earnings aggregates read from payout_snapshots: closed weeks, priced when they closed (see payouts.py)"""
+    def __init__(self):
+        self.status = PayoutSnapshot.status
+        self.day = PayoutSnapshot.day
+        self.worker_id = PayoutSnapshot.worker_id
+        self.admin_id = PayoutSnapshot.admin_id
+    
+    def count(self, condition=None):
+        value = PayoutSnapshot.completion_count if condition is None else case((condition, PayoutSnapshot.completion_count), else_=0)
+        return func.coalesce(func.sum(value), 0)
+    
+    def total(self, condition=None):
+        value = PayoutSnapshot.amount if condition is None else case((condition, PayoutSnapshot.amount), else_=None)
+        return func.coalesce(func.sum(value), 0)
+    
+    def query(self, *columns):
+        # Tasks are joined for the category, priority and active filters only; amounts are the snapshot's
+        return db.session.query(*columns).select_from(PayoutSnapshot).join(Task, PayoutSnapshot.task_id == Task.id)
+
+LIVE_EARNINGS = _LiveEarnings()
+ROLLUP_EARNINGS = _RollupEarnings()
+SNAPSHOT_EARNINGS = _SnapshotEarnings()
+
+def earnings_source(needs_task_columns=False):
+    """Pick where earnings aggregates are read from
+    
+    The rollup only knows admin, worker, day and status, so anything that
+    filters on task columns (priority, active/inactive) reads live rows.
+    """
+    if needs_task_columns or not current_app.config.get('EARNINGS_ROLLUP_READS'):
+        return LIVE_EARNINGS
+    return ROLLUP_EARNINGS
+
+def _closed_through(admin_id):
+    """Last day of the household's closed payout weeks when PAYOUT_SNAPSHOT_READS is on, else None"""
+    if not current_app.config.get('PAYOUT_SNAPSHOT_READS'):
+        return None
+    return ledger.closed_through(admin_id)
+
+def _worker_admin_id(worker_id):
+    return db.session.query(User.admin_id).filter(User.id == worker_id).scalar()
+
+def _earnings_parts(admin_id, start_date=None, end_date=None, needs_task_columns=False):
+    """Split a date range into (source, start, end) parts: closed weeks, then live days
+    
+    Days up to the household's latest closed week are read from the frozen
+    payout snapshots; only later days come from earnings_source(). A None
+    start or end leaves that side of the range open; filter parts with
+    _part_days().
+    """
+    closed = _closed_through(admin_id)
+    if closed is None:
+        return [(earnings_source(needs_task_columns), start_date, end_date)]
+    parts = []
+    if start_date is None or start_date <= closed:
+        parts.append((SNAPSHOT_EARNINGS, start_date, closed if end_date is None else min(end_date, closed)))
+    if end_date is None or end_date > closed:
+        first_open = closed + timedelta(days=1)
+        parts.append((earnings_source(needs_task_columns), first_open if start_date is None else max(start_date, first_open), end_date))
+    return parts
+
+def _part_days(source, start_date, end_date):
+    """Filter conditions limiting source to the days of one _earnings_parts() part"""
+    conditions = []
+    if start_date is not None:
+        conditions.append(source.day >= start_date)
+    if end_date is not None:
+        conditions.append(source.day <= end_date)
+    return conditions
+
+def _sum_rows(rows):
+    """Add aggregate rows from several parts column by column, into a dict keyed by label"""
+    totals = {}
+    for row in rows:
+        for key, value in row._mapping.items():
+            totals[key] = totals.get(key, 0) + (value or 0)
+    return totals
+
+def _as_money(value):
+    """Normalise an aggregate result to a Decimal with two places"""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+def empty_activity_totals():
+    """Zeroed activity totals, matching the keys produced by _activity_totals_columns"""
+    return {
+        'count': 0,
+        'total_value': Decimal('0.00'),
+        'approved_total': Decimal('0.00'),
+        'paid_total': Decimal('0.00'),
+        'awaiting_payment': Decimal('0.00'),
+        'rejected_total': Decimal('0.00')
+    }
+
+def _merge_activity_totals(totals, other):
+    """Add a totals dict from _activity_totals_from_row into totals"""
+    for key in totals:
+        totals[key] += other[key]
+    return totals
+
+def add_to_activity_totals(totals, status, value):
+    """Add one completion's value to a totals dict from empty_activity_totals"""
+    totals['count'] += 1
+    totals['total_value'] += value
+    if status in ['approved', 'paid']:
+        totals['approved_total'] += value
+    if status == 'paid':
+        totals['paid_total'] += value
+    elif status == 'approved':
+        totals['awaiting_payment'] += value
+    elif status == 'rejected':
+        totals['rejected_total'] += value
+
+def _activity_totals_columns(source):
+    """Aggregate columns for activity reports (count and value totals by status)"""
+    return [
+        source.count().label('count'),
+        source.total().label('total_value'),
+        source.total(source.status.in_(['approved', 'paid'])).label('approved_total'),
+        source.total(source.status == 'paid').label('paid_total'),
+        source.total(source.status == 'approved').label('awaiting_payment'),
+        source.total(source.status == 'rejected').label('rejected_total')
+    ]
+
+def _activity_totals_from_row(row):
+    """Convert an aggregate row from _activity_totals_columns into a totals dict"""
+    return {
+        'count': int(row.count),
+        'total_value': _as_money(row.total_value),
+        'approved_total': _as_money(row.approved_total),
+        'paid_total': _as_money(row.paid_total),
+        'awaiting_payment': _as_money(row.awaiting_payment),
+        'rejected_total': _as_money(row.rejected_total)
+    }
+
+def _apply_activity_filters(query, start_date, end_date, status_filter='all', priority_filter='all', task_status_filter='all', source=LIVE_EARNINGS):
+    """Apply the report date range and status/priority/task status filters to a completion query"""
+    query = query.filter(
+        source.day >= start_date,
+        source.day <= end_date
+    )
+    
+    # Apply status filter (completion status)
+    if status_filter != 'all':
+        query = query.filter(source.status == status_filter)
+    
+    # Apply priority filter
+    if priority_filter != 'all':
+        query = query.filter(Task.priority == priority_filter)
+    
+    # Apply task status filter (active/inactive)
+    if task_status_filter != 'all':
+        if task_status_filter == 'active':
+            query = query.filter(Task.is_active == True)
+        elif task_status_filter == 'inactive':
+            query = query.filter(Task.is_active == False)
+    
+    return query
+
+def _activity_line_items_query():
+    """Column query for report line items (completion joined to its task, no ORM rows)
+    
+    With PAYOUT_SNAPSHOT_READS on, completions in closed weeks are valued at
+    their frozen payout snapshot price, as _earnings_parts() totals them.
+    Snapshot rows only exist for days up to ledger.closed_through(), so the
+    outer join matches exactly the closed part of the range.
+    """
+    snapshot_reads = current_app.config.get('PAYOUT_SNAPSHOT_READS')
+    if snapshot_reads:
+        value = func.coalesce(
+            cast(PayoutSnapshot.amount / PayoutSnapshot.completion_count, Task.monetary_value.type),
+            Task.monetary_value
+        )
+    else:
+        value = Task.monetary_value
+    query = db.session.query(
+        TaskCompletion.worker_id,
+        Task.title.label('task_title'),
+        TaskCompletion.completion_date,
+        value.label('value'),
+        TaskCompletion.status,
+        TaskCompletion.reviewed_at,
+        TaskCompletion.submitted_at
+    ).join(Task, TaskCompletion.task_id == Task.id)
+    if snapshot_reads:
+        query = query.outerjoin(PayoutSnapshot, and_(
+            PayoutSnapshot.worker_id == TaskCompletion.worker_id,
+            PayoutSnapshot.day == TaskCompletion.completion_date,
+            PayoutSnapshot.task_id == TaskCompletion.task_id,
+            PayoutSnapshot.status == TaskCompletion.status,
+            PayoutSnapshot.completion_count > 0
+        ))
+    return query
+
+def _activity_line_item(row):
+    """Convert a line item row into the dict used by reports and exports"""
+    return {
+        'task_title': row.task_title,
+        'completion_date': row.completion_date,
+        'value': row.value,
+        'status': row.status,
+        'reviewed_date': row.reviewed_at,
+        'submitted_date': row.submitted_at
+    }
+
+def attach_payout_values(completions):
+    """Give completions in closed weeks their frozen payout price as TaskCompletion.value (one query)
+    
+    Other completions, and all of them with PAYOUT_SNAPSHOT_READS off, keep
+    their task's current value. Returns completions.
+    """
+    if not completions or not current_app.config.get('PAYOUT_SNAPSHOT_READS'):
+        return completions
+    keys = {(completion.worker_id, completion.completion_date, completion.task_id) for completion in completions}
+    prices = {
+        (row.worker_id, row.day, row.task_id): (Decimal(row.amount) / row.completion_count).quantize(Decimal('0.01'))
+        for row in db.session.query(
+            PayoutSnapshot.worker_id, PayoutSnapshot.day, PayoutSnapshot.task_id,
+            PayoutSnapshot.amount, PayoutSnapshot.completion_count
+        ).filter(
+            tuple_(PayoutSnapshot.worker_id, PayoutSnapshot.day, PayoutSnapshot.task_id).in_(keys),
+            PayoutSnapshot.completion_count > 0
+        )
+    }
+    for completion in completions:
+        price = prices.get((completion.worker_id, completion.completion_date, completion.task_id))
+        if price is not None:
+            completion.payout_value = price
+    return completions
+
+def _admin_workers_query(admin_id):
+    """Active workers under an admin"""
+    return User.query.filter_by(admin_id=admin_id, role='worker', is_active=True)
+
+def iter_activity_line_items(worker_ids, start_date, end_date, status_filter='all', priority_filter='all', task_status_filter='all', batch_size=500):
+    """Yield report line item rows for the given workers, fetched in server-side batches
+    
+    Rows are ordered by worker, then most recent completion first, and carry
+    worker_id, task_title, completion_date, value, status, reviewed_at and
+    submitted_at. Memory use stays constant however many rows match.
+    """
+    if not worker_ids:
+        return
+    query = _apply_activity_filters(
+        _activity_line_items_query().filter(TaskCompletion.worker_id.in_(worker_ids)),
+        start_date, end_date, status_filter, priority_filter, task_status_filter
+    )
+    yield from query.order_by(TaskCompletion.worker_id, TaskCompletion.completion_date.desc()).yield_per(batch_size)
+
 def calculate_worker_payment(worker_id, start_date, end_date):
     """Calculate total payment for a worker in given date range (approved tasks only)"""
-    completions = TaskCompletion.query.join(Task).filter(
+    completions = _activity_line_items_query().filter(
         TaskCompletion.worker_id == worker_id,
         TaskCompletion.status == 'approved',
         TaskCompletion.completion_date >= start_date,
@@ -28,11 +337,11 @@ def calculate_worker_payment(worker_id, start_date, end_date):
     completion_details = []
     
     for completion in completions:
-        total += completion.task.monetary_value
+        total += completion.value
         completion_details.append({
-            'task_title': completion.task.title,
+            'task_title': completion.task_title,
             'completion_date': completion.completion_date,
-            'value': completion.task.monetary_value,
+            'value': completion.value,
             'approved_date': completion.reviewed_at,
             'status': completion.status
         })
@@ -45,69 +354,25 @@ def calculate_worker_payment(worker_id, start_date, end_date):
 
 def get_all_worker_activity(worker_id, start_date, end_date, status_filter='all', priority_filter='all', task_status_filter='all'):
     """Get ALL task completions for a worker in given date range (any status or filtered)"""
-    query = TaskCompletion.query.join(Task).filter(
-        TaskCompletion.worker_id == worker_id,
-        TaskCompletion.completion_date >= start_date,
-        TaskCompletion.completion_date <= end_date
+    query = _apply_activity_filters(
+        _activity_line_items_query().filter(TaskCompletion.worker_id == worker_id),
+        start_date, end_date, status_filter, priority_filter, task_status_filter
     )
-    
-    # Apply status filter (completion status)
-    if status_filter != 'all':
-        query = query.filter(TaskCompletion.status == status_filter)
-    
-    # Apply priority filter
-    if priority_filter != 'all':
-        query = query.filter(Task.priority == priority_filter)
-    
-    # Apply task status filter (active/inactive)
-    if task_status_filter != 'all':
-        if task_status_filter == 'active':
-            query = query.filter(Task.is_active == True)
-        elif task_status_filter == 'inactive':
-            query = query.filter(Task.is_active == False)
-    
     completions = query.order_by(TaskCompletion.completion_date.desc()).all()
     
-    total_value = Decimal('0.00')
-    approved_total = Decimal('0.00')
-    paid_total = Decimal('0.00')
-    awaiting_payment = Decimal('0.00')
-    rejected_total = Decimal('0.00')
+    activity_data = empty_activity_totals()
     completion_details = []
     
     for completion in completions:
-        total_value += completion.task.monetary_value
-        if completion.status in ['approved', 'paid']:
-            approved_total += completion.task.monetary_value
-        if completion.status == 'paid':
-            paid_total += completion.task.monetary_value
-        elif completion.status == 'approved':
-            awaiting_payment += completion.task.monetary_value
-        elif completion.status == 'rejected':
-            rejected_total += completion.task.monetary_value
-            
-        completion_details.append({
-            'task_title': completion.task.title,
-            'completion_date': completion.completion_date,
-            'value': completion.task.monetary_value,
-            'status': completion.status,
-            'reviewed_date': completion.reviewed_at,
-            'submitted_date': completion.submitted_at
-        })
+        add_to_activity_totals(activity_data, completion.status, completion.value)
+        completion_details.append(_activity_line_item(completion))
     
-    return {
-        'total_value': total_value,
-        'approved_total': approved_total,
-        'paid_total': paid_total,
-        'awaiting_payment': awaiting_payment,
-        'rejected_total': rejected_total,
-        'completions': completion_details,
-        'count': len(completion_details)
-    }
+    activity_data['completions'] = completion_details
+    return activity_data
 
 def calculate_worker_paid_earnings(worker_id):
     """Calculate total paid earnings for a worker (all time)"""
-    completions = TaskCompletion.query.join(Task).filter(
+    completions = _activity_line_items_query().filter(
         TaskCompletion.worker_id == worker_id,
         TaskCompletion.status == 'paid'
     ).all()
@@ -116,11 +381,11 @@ def calculate_worker_paid_earnings(worker_id):
     completion_details = []
     
     for completion in completions:
-        total += completion.task.monetary_value
+        total += completion.value
         completion_details.append({
-            'task_title': completion.task.title,
+            'task_title': completion.task_title,
             'completion_date': completion.completion_date,
-            'value': completion.task.monetary_value,
+            'value': completion.value,
             'paid_date': completion.reviewed_at
         })
     
@@ -130,15 +395,60 @@ def calculate_worker_paid_earnings(worker_id):
         'count': len(completion_details)
     }
 
-def calculate_admin_payments(admin_id, start_date, end_date):
-    """Calculate payments for all workers under an admin"""
-    workers = User.query.filter_by(admin_id=admin_id, role='worker', is_active=True).all()
+def calculate_admin_payments(admin_id, start_date, end_date, include_completions=True):
+    """Calculate payments for all workers under an admin (approved tasks only)
+    
+    Per-worker totals come from one GROUP BY query; line items are fetched in
+    one joined query only when include_completions is set.
+    """
+    workers = _admin_workers_query(admin_id).all()
+    worker_ids = [worker.id for worker in workers]
+    
+    totals = {}
+    completions_by_worker = {worker_id: [] for worker_id in worker_ids}
+    
+    if worker_ids:
+        for source, part_start, part_end in _earnings_parts(admin_id, start_date, end_date):
+            rows = source.query(
+                source.worker_id,
+                source.count().label('count'),
+                source.total().label('total')
+            ).filter(
+                source.worker_id.in_(worker_ids),
+                source.status == 'approved',
+                source.day >= part_start,
+                source.day <= part_end
+            ).group_by(source.worker_id).all()
+            for row in rows:
+                count, total = totals.get(row.worker_id, (0, Decimal('0.00')))
+                totals[row.worker_id] = (count + int(row.count), total + _as_money(row.total))
+        
+        if include_completions:
+            approved_in_range = and_(
+                TaskCompletion.worker_id.in_(worker_ids),
+                TaskCompletion.status == 'approved',
+                TaskCompletion.completion_date >= start_date,
+                TaskCompletion.completion_date <= end_date
+            )
+            for row in _activity_line_items_query().filter(approved_in_range).order_by(TaskCompletion.worker_id).all():
+                completions_by_worker[row.worker_id].append({
+                    'task_title': row.task_title,
+                    'completion_date': row.completion_date,
+                    'value': row.value,
+                    'approved_date': row.reviewed_at,
+                    'status': row.status
+                })
     
     results = {}
     grand_total = Decimal('0.00')
     
     for worker in workers:
-        payment_data = calculate_worker_payment(worker.id, start_date, end_date)
+        count, total = totals.get(worker.id, (0, Decimal('0.00')))
+        payment_data = {
+            'total': total,
+            'completions': completions_by_worker[worker.id],
+            'count': count
+        }
         results[worker.id] = {
             'worker': worker,
             'payment_data': payment_data
@@ -151,55 +461,242 @@ def calculate_admin_payments(admin_id, start_date, end_date):
         'period': f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
     }
 
-def get_all_admin_activity(admin_id, start_date, end_date, status_filter='all', priority_filter='all', task_status_filter='all'):
-    """Get ALL task activity for all workers under an admin in given date range (any status or filtered)"""
-    workers = User.query.filter_by(admin_id=admin_id, role='worker', is_active=True).all()
+def get_all_admin_activity(admin_id, start_date, end_date, status_filter='all', priority_filter='all', task_status_filter='all', include_completions=True):
+    """Get ALL task activity for all workers under an admin in given date range (any status or filtered)
+    
+    Per-worker totals come from one GROUP BY query and the grand totals are
+    summed from those rows. Line items are fetched in one joined query only
+    when include_completions is set; otherwise each worker's 'completions'
+    list is left empty and only 'count' is populated.
+    """
+    workers = _admin_workers_query(admin_id).all()
+    worker_ids = [worker.id for worker in workers]
+    
+    totals = {}
+    completions_by_worker = {worker_id: [] for worker_id in worker_ids}
+    
+    if worker_ids:
+        parts = _earnings_parts(admin_id, start_date, end_date, needs_task_columns=priority_filter != 'all' or task_status_filter != 'all')
+        for source, part_start, part_end in parts:
+            aggregate_query = _apply_activity_filters(
+                source.query(source.worker_id, *_activity_totals_columns(source))
+                .filter(source.worker_id.in_(worker_ids)),
+                part_start, part_end, status_filter, priority_filter, task_status_filter, source=source
+            )
+            for row in aggregate_query.group_by(source.worker_id).all():
+                _merge_activity_totals(totals.setdefault(row.worker_id, empty_activity_totals()), _activity_totals_from_row(row))
+        
+        if include_completions:
+            line_items_query = _apply_activity_filters(
+                _activity_line_items_query().filter(TaskCompletion.worker_id.in_(worker_ids)),
+                start_date, end_date, status_filter, priority_filter, task_status_filter
+            )
+            for row in line_items_query.order_by(TaskCompletion.worker_id, TaskCompletion.completion_date.desc()).all():
+                completions_by_worker[row.worker_id].append(_activity_line_item(row))
     
     results = {}
-    grand_total_value = Decimal('0.00')
-    grand_approved_total = Decimal('0.00')
-    grand_paid_total = Decimal('0.00')
-    grand_awaiting_payment = Decimal('0.00')
-    grand_rejected_total = Decimal('0.00')
+    grand_totals = empty_activity_totals()
     
     for worker in workers:
-        activity_data = get_all_worker_activity(worker.id, start_date, end_date, status_filter, priority_filter, task_status_filter)
+        activity_data = totals.get(worker.id) or empty_activity_totals()
+        activity_data['completions'] = completions_by_worker[worker.id]
         results[worker.id] = {
             'worker': worker,
             'activity_data': activity_data
         }
-        grand_total_value += activity_data['total_value']
-        grand_approved_total += activity_data['approved_total']
-        
-        # Calculate paid, awaiting payment, and rejected totals
-        for completion in activity_data['completions']:
-            if completion['status'] == 'paid':
-                grand_paid_total += completion['value']
-            elif completion['status'] == 'approved':
-                grand_awaiting_payment += completion['value']
-            elif completion['status'] == 'rejected':
-                grand_rejected_total += completion['value']
+        for key in grand_totals:
+            grand_totals[key] += activity_data[key]
     
     return {
         'workers': results,
-        'grand_total_value': grand_total_value,
-        'grand_approved_total': grand_approved_total,
-        'grand_paid_total': grand_paid_total,
-        'grand_awaiting_payment': grand_awaiting_payment,
-        'grand_rejected_total': grand_rejected_total,
+        'grand_total_value': grand_totals['total_value'],
+        'grand_approved_total': grand_totals['approved_total'],
+        'grand_paid_total': grand_totals['paid_total'],
+        'grand_awaiting_payment': grand_totals['awaiting_payment'],
+        'grand_rejected_total': grand_totals['rejected_total'],
         'period': f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
     }
 
-def get_pending_approvals(admin_id):
-    """Get all pending task completions for an admin's workers"""
-    return TaskCompletion.query.join(Task).join(User, TaskCompletion.worker_id == User.id).filter(
+# Trend report buckets and series
+TREND_INTERVALS = {'day': 'Daily', 'week': 'Weekly', 'month': 'Monthly'}
+TREND_GROUPS = {'worker': 'Per Worker', 'category': 'Per Category'}
+
+def _period_start(day, interval):
+    """SQL expression for the first day of the day, week (Monday, as get_week_dates) or month containing day"""
+    if interval == 'day':
+        return day
+    # Literal SQL rather than bound parameters, so the SELECT and GROUP BY expressions are identical
+    if db.session.get_bind().dialect.name == 'sqlite':
+        if interval == 'week':
+            return func.date(day, literal_column("'weekday 0'"), literal_column("'-6 days'"), type_=db.Date)
+        return func.date(day, literal_column("'start of month'"), type_=db.Date)
+    return cast(func.date_trunc(literal_column(f"'{interval}'"), day), db.Date)
+
+def format_trend_period(period_start, interval):
+    """Label for a trend bucket starting on period_start"""
+    if interval == 'month':
+        return period_start.strftime('%B %Y')
+    if interval == 'week':
+        return f"w/c {period_start.strftime('%d/%m/%Y')}"
+    return period_start.strftime('%d/%m/%Y')
+
+def get_earnings_trends(admin_id, start_date, end_date, interval='week', group_by='worker', worker_id=None, status_filter='all', priority_filter='all', task_status_filter='all'):
+    """Activity totals per day, week or month for each worker (or task category), grouped in SQL
+    
+    One GROUP BY query over the period start and the series key; no
+    completion rows are loaded. Returns dicts ordered by period then series,
+    with period_start, period (label), key, label and the activity totals
+    keys, for the admin's active workers or just worker_id. Buckets with no
+    activity are left out. Categories are task columns, so grouping by
+    category reads live rows rather than the rollup for days that are not
+    in a closed payout week.
+    """
+    if interval not in TREND_INTERVALS or group_by not in TREND_GROUPS:
+        raise ValueError(f"Unknown trend interval {interval!r} or grouping {group_by!r}")
+    workers = {worker.id: worker for worker in _admin_workers_query(admin_id).all()}
+    worker_ids = [worker_id] if worker_id is not None else list(workers)
+    if not worker_ids:
+        return []
+    
+    # A week or month spanning the last closed day gets a row from each part; they are merged here
+    buckets = {}
+    parts = _earnings_parts(admin_id, start_date, end_date, needs_task_columns=group_by == 'category' or priority_filter != 'all' or task_status_filter != 'all')
+    for source, part_start, part_end in parts:
+        period = _period_start(source.day, interval)
+        key = source.worker_id if group_by == 'worker' else func.coalesce(Task.category, '')
+        query = _apply_activity_filters(
+            source.query(period.label('period_start'), key.label('key'), *_activity_totals_columns(source))
+            .filter(source.worker_id.in_(worker_ids)),
+            part_start, part_end, status_filter, priority_filter, task_status_filter, source=source
+        )
+        for row in query.group_by(period, key).all():
+            _merge_activity_totals(buckets.setdefault((row.period_start, row.key), empty_activity_totals()), _activity_totals_from_row(row))
+    
+    trends = []
+    for (period_start, key), totals in sorted(buckets.items()):
+        if group_by == 'worker':
+            label = workers[key].get_full_name() if key in workers else f"Worker {key}"
+        else:
+            label = key or 'Uncategorised'
+        trends.append({
+            'period_start': period_start,
+            'period': format_trend_period(period_start, interval),
+            'key': key,
+            'label': label,
+            **totals
+        })
+    return trends
+
+# Rows per page for keyset-paginated lists (completion history, approval queue)
+PAGE_SIZE = 50
+
+def encode_page_cursor(completion):
+    """Cursor pointing just past a completion in (submitted_at, id) descending order"""
+    return f"{completion.submitted_at.isoformat()}_{completion.id}"
+
+def decode_page_cursor(cursor):
+    """Parse a cursor from encode_page_cursor, returning None for a missing or malformed one"""
+    if not cursor:
+        return None
+    try:
+        submitted_at, completion_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(submitted_at), int(completion_id)
+    except ValueError:
+        return None
+
+def keyset_page(query, cursor=None, page_size=PAGE_SIZE):
+    """Fetch one page of a completion query, newest first, using keyset pagination
+    
+    Ordering is (submitted_at, id) descending and the page starts strictly
+    after the cursor, so the cost of a page does not depend on how far back
+    it is. Returns (completions, next_cursor); next_cursor is None on the
+    last page.
+    """
+    position = decode_page_cursor(cursor)
+    if position:
+        query = query.filter(tuple_(TaskCompletion.submitted_at, TaskCompletion.id) < tuple_(*position))
+    
+    completions = query.order_by(
+        TaskCompletion.submitted_at.desc(), TaskCompletion.id.desc()
+    ).limit(page_size + 1).all()
+    
+    if len(completions) > page_size:
+        completions = completions[:page_size]
+        return completions, encode_page_cursor(completions[-1])
+    return completions, None
+
+def _pending_approvals_query(admin_id):
+    return TaskCompletion.query.join(TaskCompletion.task).join(TaskCompletion.worker).filter(
         Task.created_by == admin_id,
         TaskCompletion.status == 'pending'
+    )
+
+def get_pending_approvals(admin_id):
+    """Get all pending task completions for an admin's workers (task and worker loaded)"""
+    return _pending_approvals_query(admin_id).options(
+        *eager_load_options(contains_eager(TaskCompletion.task), contains_eager(TaskCompletion.worker))
     ).order_by(TaskCompletion.submitted_at.desc()).all()
 
+def get_pending_approvals_page(admin_id, cursor=None, page_size=PAGE_SIZE):
+    """Get one page of pending task completions for an admin's workers, plus the next cursor"""
+    query = _pending_approvals_query(admin_id).options(
+        *eager_load_options(contains_eager(TaskCompletion.task), contains_eager(TaskCompletion.worker))
+    )
+    completions, next_cursor = keyset_page(query, cursor, page_size)
+    return attach_payout_values(completions), next_cursor
+
+def count_pending_approvals(admin_id):
+    """Count pending task completions for an admin's workers"""
+    source = earnings_source()
+    return int(source.query(source.count()).filter(
+        source.admin_id == admin_id,
+        source.status == 'pending'
+    ).scalar())
+
+def _completion_history_query(worker_id, status_filter='all'):
+    query = TaskCompletion.query.filter(TaskCompletion.worker_id == worker_id)
+    if status_filter != 'all':
+        if status_filter == 'awaiting_payment':
+            query = query.filter(TaskCompletion.status == 'approved')
+        else:
+            query = query.filter(TaskCompletion.status == status_filter)
+    return query
+
+def get_completion_history_page(worker_id, status_filter='all', cursor=None, page_size=PAGE_SIZE):
+    """Get one page of a worker's completion history (task and reviewer loaded), plus the next cursor"""
+    query = _completion_history_query(worker_id, status_filter).options(
+        *eager_load_options(joinedload(TaskCompletion.task), joinedload(TaskCompletion.reviewer))
+    )
+    completions, next_cursor = keyset_page(query, cursor, page_size)
+    return attach_payout_values(completions), next_cursor
+
+def get_completion_history_summary(worker_id, status_filter='all'):
+    """Summary card figures for the whole (filtered) completion history, one aggregate query per earnings part"""
+    rows = []
+    for source, part_start, part_end in _earnings_parts(_worker_admin_id(worker_id)):
+        query = source.query(
+            source.count().label('total_count'),
+            source.count(source.status == 'approved').label('approved_count'),
+            source.count(source.status == 'pending').label('pending_count'),
+            source.total(source.status == 'paid').label('paid_total')
+        ).filter(source.worker_id == worker_id, *_part_days(source, part_start, part_end))
+        if status_filter != 'all':
+            query = query.filter(source.status == ('approved' if status_filter == 'awaiting_payment' else status_filter))
+        rows.append(query.one())
+    row = _sum_rows(rows)
+    
+    return {
+        'total_count': int(row['total_count']),
+        'approved_count': int(row['approved_count']),
+        'pending_count': int(row['pending_count']),
+        'paid_total': _as_money(row['paid_total'])
+    }
+
 def get_approved_tasks_for_payment(admin_id, worker_id=None):
-    """Get approved tasks that haven't been paid yet"""
-    query = TaskCompletion.query.join(Task).join(User, TaskCompletion.worker_id == User.id).filter(
+    """Get approved tasks that haven't been paid yet (task and worker loaded)"""
+    query = TaskCompletion.query.join(TaskCompletion.task).join(TaskCompletion.worker).options(
+        *eager_load_options(contains_eager(TaskCompletion.task), contains_eager(TaskCompletion.worker))
+    ).filter(
         Task.created_by == admin_id,
         TaskCompletion.status == 'approved'
     )
@@ -207,97 +704,303 @@ def get_approved_tasks_for_payment(admin_id, worker_id=None):
     if worker_id:
         query = query.filter(TaskCompletion.worker_id == worker_id)
     
-    return query.order_by(TaskCompletion.reviewed_at.desc()).all()
+    return attach_payout_values(query.order_by(TaskCompletion.reviewed_at.desc()).all())
 
 def get_worker_payment_summary(worker_id):
     """Get payment summary for a specific worker"""
-    approved_tasks = TaskCompletion.query.join(Task).filter(
+    approved_tasks = TaskCompletion.query.join(TaskCompletion.task).options(
+        *eager_load_options(contains_eager(TaskCompletion.task))
+    ).filter(
         TaskCompletion.worker_id == worker_id,
         TaskCompletion.status == 'approved'
     ).all()
     
-    paid_tasks = TaskCompletion.query.join(Task).filter(
-        TaskCompletion.worker_id == worker_id,
-        TaskCompletion.status == 'paid'
-    ).all()
+    attach_payout_values(approved_tasks)
     
-    approved_total = sum(completion.task.monetary_value for completion in approved_tasks)
-    paid_total = sum(completion.task.monetary_value for completion in paid_tasks)
+    rows = []
+    for source, part_start, part_end in _earnings_parts(_worker_admin_id(worker_id)):
+        rows.append(source.query(source.count().label('paid_count'), source.total().label('paid_total')).filter(
+            source.worker_id == worker_id,
+            source.status == 'paid',
+            *_part_days(source, part_start, part_end)
+        ).one())
+    paid = _sum_rows(rows)
     
     return {
         'approved_count': len(approved_tasks),
-        'approved_total': approved_total,
-        'paid_count': len(paid_tasks),
-        'paid_total': paid_total,
+        'approved_total': sum((completion.value for completion in approved_tasks), Decimal('0.00')),
+        'paid_count': int(paid['paid_count']),
+        'paid_total': _as_money(paid['paid_total']),
         'unpaid_tasks': approved_tasks
     }
 
+@dataclass
+class WorkerPaymentSummary:
+    """Payment summary for one worker card on the admin dashboard"""
+    approved_count: int = 0
+    approved_total: Decimal = Decimal('0.00')
+    paid_count: int = 0
+    paid_total: Decimal = Decimal('0.00')
+    unpaid_tasks: list = field(default_factory=list)
+
+@dataclass
+class AdminDashboardSnapshot:
+    """Every number shown on the admin dashboard"""
+    workers: list
+    pending_count: int
+    awaiting_payment_total: Decimal
+    active_tasks: int
+    week_total: Decimal
+    worker_payment_data: dict
+
+def get_admin_dashboard_snapshot(admin_id):
+    """Build the admin dashboard in a fixed number of queries, independent of worker count
+    
+    1. the admin's active workers
+    2. the active task count
+    3. admin-wide pending count and awaiting payment total, per earnings part
+    4. per-worker approved/paid counts and totals plus this week's approved
+       total, per earnings part
+    5. approved (unpaid) completions for all workers, with their tasks and
+       frozen payout values
+    """
+    workers = _admin_workers_query(admin_id).all()
+    worker_ids = [worker.id for worker in workers]
+    
+    active_tasks_count = select(func.count(Task.id)).where(
+        Task.created_by == admin_id,
+        Task.is_active == True
+    ).scalar_subquery()
+    
+    parts = _earnings_parts(admin_id)
+    admin_rows = []
+    for source, part_start, part_end in parts:
+        admin_rows.append(source.query(
+            source.count(source.status == 'pending').label('pending_count'),
+            source.total(source.status == 'approved').label('awaiting_payment_total')
+        ).filter(
+            source.admin_id == admin_id,
+            *_part_days(source, part_start, part_end)
+        ).one())
+    admin_row = _sum_rows(admin_rows)
+    active_tasks = db.session.query(active_tasks_count).scalar()
+    
+    worker_payment_data = {worker_id: WorkerPaymentSummary() for worker_id in worker_ids}
+    week_total = Decimal('0.00')
+    
+    if worker_ids:
+        start_of_week, end_of_week = get_week_dates()
+        for source, part_start, part_end in parts:
+            approved_this_week = and_(
+                source.status == 'approved',
+                source.day >= start_of_week,
+                source.day <= end_of_week
+            )
+            
+            rows = source.query(
+                source.worker_id,
+                source.count(source.status == 'approved').label('approved_count'),
+                source.total(source.status == 'approved').label('approved_total'),
+                source.count(source.status == 'paid').label('paid_count'),
+                source.total(source.status == 'paid').label('paid_total'),
+                source.total(approved_this_week).label('week_total')
+            ).filter(
+                source.worker_id.in_(worker_ids),
+                source.status.in_(['approved', 'paid']),
+                *_part_days(source, part_start, part_end)
+            ).group_by(source.worker_id).all()
+            
+            for row in rows:
+                summary = worker_payment_data[row.worker_id]
+                summary.approved_count += int(row.approved_count)
+                summary.approved_total += _as_money(row.approved_total)
+                summary.paid_count += int(row.paid_count)
+                summary.paid_total += _as_money(row.paid_total)
+                week_total += _as_money(row.week_total)
+        
+        unpaid_tasks = TaskCompletion.query.join(TaskCompletion.task).options(
+            *eager_load_options(contains_eager(TaskCompletion.task))
+        ).filter(
+            TaskCompletion.worker_id.in_(worker_ids),
+            TaskCompletion.status == 'approved'
+        ).order_by(TaskCompletion.worker_id, TaskCompletion.id).all()
+        attach_payout_values(unpaid_tasks)
+        
+        for completion in unpaid_tasks:
+            worker_payment_data[completion.worker_id].unpaid_tasks.append(completion)
+    
+    return AdminDashboardSnapshot(
+        workers=workers,
+        pending_count=int(admin_row['pending_count']),
+        awaiting_payment_total=_as_money(admin_row['awaiting_payment_total']),
+        active_tasks=int(active_tasks or 0),
+        week_total=week_total,
+        worker_payment_data=worker_payment_data
+    )
+
 def get_worker_stats(worker_id):
-    """Get statistics for a worker"""
-    total_completed = TaskCompletion.query.filter_by(worker_id=worker_id).count()
-    approved_count = TaskCompletion.query.filter_by(worker_id=worker_id, status='approved').count()
-    rejected_count = TaskCompletion.query.filter_by(worker_id=worker_id, status='rejected').count()
-    pending_count = TaskCompletion.query.filter_by(worker_id=worker_id, status='pending').count()
-    paid_count = TaskCompletion.query.filter_by(worker_id=worker_id, status='paid').count()
-    
-    # Calculate total awaiting payment (approved but not paid)
-    approved_tasks = TaskCompletion.query.join(Task).filter(
-        TaskCompletion.worker_id == worker_id,
-        TaskCompletion.status == 'approved'
-    ).all()
-    awaiting_payment_total = sum(completion.task.monetary_value for completion in approved_tasks)
-    
-    # Calculate total paid earnings
-    paid_earnings = calculate_worker_paid_earnings(worker_id)
-    
-    # Calculate this week's earnings (all approved/paid tasks this week)
+    """Get statistics for a worker (one aggregate query per earnings part)"""
     start_of_week, end_of_week = get_week_dates()
-    week_payment = calculate_worker_payment(worker_id, start_of_week, end_of_week)
+    rows = []
+    for source, part_start, part_end in _earnings_parts(_worker_admin_id(worker_id)):
+        approved_this_week = and_(
+            source.status == 'approved',
+            source.day >= start_of_week,
+            source.day <= end_of_week
+        )
+        
+        rows.append(source.query(
+            source.count().label('total_completed'),
+            source.count(source.status == 'approved').label('approved_count'),
+            source.count(source.status == 'rejected').label('rejected_count'),
+            source.count(source.status == 'pending').label('pending_count'),
+            source.count(source.status == 'paid').label('paid_count'),
+            source.total(source.status == 'approved').label('awaiting_payment_total'),
+            source.total(source.status == 'paid').label('paid_total'),
+            # This week's earnings (approved tasks this week, as calculate_worker_payment)
+            source.count(approved_this_week).label('this_week_count'),
+            source.total(approved_this_week).label('this_week_total')
+        ).filter(
+            source.worker_id == worker_id,
+            *_part_days(source, part_start, part_end)
+        ).one())
+    row = _sum_rows(rows)
+    
+    total_completed = int(row['total_completed'] or 0)
+    approved_count = int(row['approved_count'])
     
     return {
         'total_completed': total_completed,
         'approved_count': approved_count,
-        'rejected_count': rejected_count,
-        'pending_count': pending_count,
-        'paid_count': paid_count,
+        'rejected_count': int(row['rejected_count']),
+        'pending_count': int(row['pending_count']),
+        'paid_count': int(row['paid_count']),
         'approval_rate': (approved_count / total_completed * 100) if total_completed > 0 else 0,
-        'awaiting_payment_total': awaiting_payment_total,
+        'awaiting_payment_total': _as_money(row['awaiting_payment_total']),
         'awaiting_payment_count': approved_count,
-        'total_paid_earnings': paid_earnings['total'],
-        'paid_earnings_count': paid_earnings['count'],
-        'this_week_earnings': week_payment['total'],
-        'this_week_count': week_payment['count']
+        'total_paid_earnings': _as_money(row['paid_total']),
+        'paid_earnings_count': int(row['paid_count']),
+        'this_week_earnings': _as_money(row['this_week_total']),
+        'this_week_count': int(row['this_week_count'])
     }
 
-def reset_weekly_tasks(admin_id):
-    """Reset weekly task completion status for admin's workers"""
-    from models import WeeklyReset
-    from datetime import date
+# Status a completion must currently have for each bulk action
+BULK_TRANSITIONS = {
+    'approved': ['pending'],
+    'rejected': ['pending'],
+    'paid': ['approved']
+}
+
+def bulk_update_completion_status(admin_id, new_status, completion_ids=None, worker_id=None, week_start=None, admin_notes=None):
+    """Apply one status change to many of an admin's task completions in a single transaction
+    
+    Completions are chosen either by id, or as every completion for one worker
+    (optionally only the week containing week_start). One scoped query checks
+    ownership and locks the rows, and one UPDATE changes every row whose
+    current status allows the transition (see BULK_TRANSITIONS).
+    """
+    if new_status not in BULK_TRANSITIONS:
+        return False, "Invalid bulk action."
+    
+    query = db.session.query(TaskCompletion.id, TaskCompletion.status).join(
+        Task, TaskCompletion.task_id == Task.id
+    ).filter(Task.created_by == admin_id)
+    
+    if completion_ids:
+        completion_ids = set(completion_ids)
+        query = query.filter(TaskCompletion.id.in_(completion_ids))
+    elif worker_id:
+        query = query.filter(
+            TaskCompletion.worker_id == worker_id,
+            TaskCompletion.status.in_(BULK_TRANSITIONS[new_status])
+        )
+        if week_start:
+            start_of_week, end_of_week = get_week_dates(week_start)
+            query = query.filter(
+                TaskCompletion.completion_date >= start_of_week,
+                TaskCompletion.completion_date <= end_of_week
+            )
+    else:
+        return False, "No task completions selected."
+    
+    rows = query.with_for_update(of=TaskCompletion).all()
+    if completion_ids and len(rows) != len(completion_ids):
+        db.session.rollback()
+        return False, "Some selected task completions were not found."
     
-    # Check if reset already done today
-    today = date.today()
-    existing_reset = WeeklyReset.query.filter_by(admin_id=admin_id, reset_date=today).first()
+    eligible_ids = [completion_id for completion_id, status in rows if status in BULK_TRANSITIONS[new_status]]
+    if not eligible_ids:
+        db.session.rollback()
+        return True, "No task completions needed updating."
     
-    if existing_reset:
-        return False, "Weekly reset already performed today."
+    criteria = [TaskCompletion.id.in_(eligible_ids)]
+    values = {
+        'status': new_status,
+        'reviewed_at': datetime.now(timezone.utc),
+        'reviewed_by': admin_id
+    }
+    if admin_notes:
+        values['admin_notes'] = admin_notes
     
-    # Get all pending completions for this admin's workers
-    pending_completions = TaskCompletion.query.join(Task).filter(
-        Task.created_by == admin_id,
-        TaskCompletion.status == 'pending'
-    ).all()
+    try:
+        ledger.record_bulk_status_change(criteria, new_status)
+        digests.record_changes(criteria, new_status)
+        updated = TaskCompletion.query.filter(*criteria).update(values, synchronize_session=False)
+        if updated:
+            data_version.bump(admin_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return False, f"Error during bulk update: {str(e)}"
+    
+    status_text = 'marked as paid' if new_status == 'paid' else new_status
+    skipped = len(rows) - updated
+    message = f"{updated} task completion{'s' if updated != 1 else ''} {status_text}."
+    if skipped:
+        message += f" {skipped} skipped (not {' or '.join(BULK_TRANSITIONS[new_status])})."
+    return True, message
+
+def reset_pending_completions(admin_id, today):
+    """Delete all pending completions in an admin's household and record today's reset
+    
+    One DELETE removes the rows, then every finished week is closed into the
+    payout snapshots and the household version is bumped if anything was
+    deleted; the caller commits. Returns the number deleted, or None if the
+    reset already ran today (the WeeklyReset once-per-day guard).
+    """
+    from models import WeeklyReset
+    import payouts
     
-    # Remove pending completions (preserve approved/rejected for history)
-    for completion in pending_completions:
-        db.session.delete(completion)
+    if WeeklyReset.query.filter_by(admin_id=admin_id, reset_date=today).first():
+        return None
     
-    # Record the reset
-    reset_record = WeeklyReset(admin_id=admin_id, reset_date=today)
-    db.session.add(reset_record)
+    # Remove pending completions (preserve approved/rejected for history)
+    criteria = [
+        TaskCompletion.status == 'pending',
+        TaskCompletion.task_id.in_(select(Task.id).where(Task.created_by == admin_id))
+    ]
+    digests.record_changes(criteria, 'reset')
+    deleted = TaskCompletion.query.filter(*criteria).delete(synchronize_session=False)
+    ledger.remove_pending_for_admin(admin_id)
+    if deleted:
+        data_version.bump(admin_id)
+    
+    # Record the reset, and freeze the weeks it finished
+    reset = WeeklyReset(admin_id=admin_id, reset_date=today)
+    db.session.add(reset)
+    payouts.close_weeks(admin_id, today, reset)
+    return deleted
+
+def reset_weekly_tasks(admin_id):
+    """Reset weekly task completion status for admin's workers"""
+    from datetime import date
     
     try:
+        deleted = reset_pending_completions(admin_id, date.today())
+        if deleted is None:
+            return False, "Weekly reset already performed today."
         db.session.commit()
-        return True, f"Weekly reset completed. {len(pending_completions)} pending tasks reset."
+        return True, f"Weekly reset completed. {deleted} pending tasks reset."
     except Exception as e:
         db.session.rollback()
         return False, f"Error during reset: {str(e)}"
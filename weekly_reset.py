@@ -0,0 +1,108 @@
+"""Weekly reset for every household.
+
+reset_all_admins() runs the same reset as /admin/reset-weekly for every
+active admin, committing WEEKLY_RESET_BATCH_SIZE admins per transaction. The
+WeeklyReset once-per-day guard still applies, so households that were reset
+by hand today are skipped and the command is safe to re-run.
+
+    flask --app main weekly-reset              # reset every household now (cron)
+    flask --app main weekly-reset-scheduler    # stay running and reset at the configured time
+
+The scheduler runs on WEEKLY_RESET_WEEKDAY (0 = Monday) at WEEKLY_RESET_TIME
+(HH:MM, server local time, matching the guard's date.today()).
+"""
+import time
+from datetime import date, datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+from app import db
+from models import User
+from utils import reset_pending_completions
+
+bp = Blueprint('weekly_reset', __name__, cli_group=None)
+
+# Longest single sleep while waiting for the next run, so clock changes are noticed
+MAX_SLEEP_SECONDS = 60
+
+
+def reset_all_admins(batch_size=None, today=None):
+    """Reset every active admin's household, returning counts of what happened"""
+    batch_size = batch_size or current_app.config['WEEKLY_RESET_BATCH_SIZE']
+    today = today or date.today()
+    admin_ids = [
+        admin_id for (admin_id,) in db.session.query(User.id).filter_by(role='admin', is_active=True).order_by(User.id).all()
+    ]
+
+    results = {'reset': 0, 'skipped': 0, 'failed': 0, 'completions_deleted': 0}
+    for start in range(0, len(admin_ids), batch_size):
+        batch = admin_ids[start:start + batch_size]
+        batch_results = {'reset': 0, 'skipped': 0, 'completions_deleted': 0}
+        try:
+            for admin_id in batch:
+                deleted = reset_pending_completions(admin_id, today)
+                if deleted is None:
+                    batch_results['skipped'] += 1
+                else:
+                    batch_results['reset'] += 1
+                    batch_results['completions_deleted'] += deleted
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            results['failed'] += len(batch)
+            current_app.logger.error(f'Weekly reset failed for admins {batch[0]}-{batch[-1]}: {e}')
+            continue
+        for key, value in batch_results.items():
+            results[key] += value
+    return results
+
+
+def next_run_after(now):
+    """The first scheduled reset time strictly after now"""
+    hour, minute = (int(part) for part in current_app.config['WEEKLY_RESET_TIME'].split(':'))
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    run_at += timedelta(days=(current_app.config['WEEKLY_RESET_WEEKDAY'] - now.weekday()) % 7)
+    if run_at <= now:
+        run_at += timedelta(days=7)
+    return run_at
+
+
+def run_scheduler():
+    """Run reset_all_admins at every scheduled time until stopped"""
+    while True:
+        run_at = next_run_after(datetime.now())
+        current_app.logger.info(f'Next weekly reset at {run_at:%Y-%m-%d %H:%M}')
+        while datetime.now() < run_at:
+            time.sleep(min(MAX_SLEEP_SECONDS, max(0, (run_at - datetime.now()).total_seconds())))
+        try:
+            results = reset_all_admins()
+            current_app.logger.info(f'Weekly reset: {results}')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Weekly reset run failed: {e}')
+        finally:
+            db.session.remove()
+
+
+def _echo_results(results):
+    click.echo(f"Reset {results['reset']} households ({results['completions_deleted']} pending completions removed), "
+               f"{results['skipped']} already reset today, {results['failed']} failed.")
+
+
+@bp.cli.command('weekly-reset')
+@click.option('--batch-size', type=int, help='Admins per transaction (default WEEKLY_RESET_BATCH_SIZE).')
+def weekly_reset_command(batch_size):
+    """Run the weekly reset for every household now."""
+    results = reset_all_admins(batch_size)
+    _echo_results(results)
+    if results['failed']:
+        raise SystemExit(1)
+
+
+@bp.cli.command('weekly-reset-scheduler')
+def weekly_reset_scheduler_command():
+    """Run the weekly reset for every household at the configured weekday and time."""
+    click.echo(f'Weekly reset scheduled for weekday {current_app.config["WEEKLY_RESET_WEEKDAY"]} '
+               f'at {current_app.config["WEEKLY_RESET_TIME"]}; next run {next_run_after(datetime.now()):%Y-%m-%d %H:%M}.')
+    run_scheduler()